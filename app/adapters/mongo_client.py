@@ -78,6 +78,23 @@ async def close() -> None:
     _client.close()
 
 # ---------- índices ----------
+# (campo, prefijo del índice compuesto, índice previo que queda cubierto por él)
+_HCE_IDENTITY_INDEXES: List[Tuple[str, str, str]] = [
+    ("patient_id", "ix_hce_patient", "ix_hce_patient_created"),
+    ("patient.id", "ix_hce_patientdot", "ix_hce_patientdot_created"),
+    ("patientId", "ix_hce_patientId", "ix_hce_patientId_created"),
+    ("paciente_id", "ix_hce_paciente_id", "ix_hce_paciente_id_created"),
+    ("paciente.id", "ix_hce_pacientedot", "ix_hce_pacientedot_created"),
+    ("admission_id", "ix_hce_admission", "ix_hce_admission_created"),
+    ("admission.id", "ix_hce_admissiondot", "ix_hce_admissiondot_created"),
+    ("admision_id", "ix_hce_admision", "ix_hce_admision_created"),
+    ("admision.id", "ix_hce_admisiondot", "ix_hce_admisiondot_created"),
+    ("admissionId", "ix_hce_admissionId", "ix_hce_admissionId_created"),
+    ("dni", "ix_hce_dni", "ix_hce_dni"),
+    ("patient.dni", "ix_hce_patientdot_dni", "ix_hce_patientdot_dni"),
+    ("paciente.dni", "ix_hce_pacientedot_dni", "ix_hce_pacientedot_dni"),
+]
+
 def _as_key_tuple(keys: Iterable[Tuple[str, int | str]]) -> Tuple[Tuple[str, Any], ...]:
     norm: List[Tuple[str, Any]] = []
     for k, v in keys:
@@ -113,23 +130,26 @@ async def ensure_index(
                 return existing[key_tuple]
         raise
 
+async def _drop_index_if_exists(coll: AsyncIOMotorCollection, name: str) -> None:
+    try:
+        await coll.drop_index(name)
+    except OperationFailure:
+        pass
+
 async def ensure_indexes() -> None:
+    """Crea los índices que usan las consultas de la app (ver docs/INDICES_MONGODB.md)."""
     # HCEs
     for coll in await pick_hce_collections():
-        await ensure_index(coll, [("patient_id", 1), ("created_at", -1)], name="ix_hce_patient_created")
-        await ensure_index(coll, [("patient.id", 1), ("created_at", -1)], name="ix_hce_patientdot_created")
-        await ensure_index(coll, [("patientId", 1), ("created_at", -1)], name="ix_hce_patientId_created")
-        await ensure_index(coll, [("paciente_id", 1), ("created_at", -1)], name="ix_hce_paciente_id_created")
-        await ensure_index(coll, [("paciente.id", 1), ("created_at", -1)], name="ix_hce_pacientedot_created")
-        await ensure_index(coll, [("admission_id", 1), ("created_at", -1)], name="ix_hce_admission_created")
-        await ensure_index(coll, [("admission.id", 1), ("created_at", -1)], name="ix_hce_admissiondot_created")
-        await ensure_index(coll, [("admision_id", 1), ("created_at", -1)], name="ix_hce_admision_created")
-        await ensure_index(coll, [("dni", 1)], name="ix_hce_dni")
+        # Identidad + orden (created_at, _id): cada rama del $or de
+        # _find_latest_hce_for_patient se resuelve por índice sin SORT en memoria.
+        for field, base, superseded in _HCE_IDENTITY_INDEXES:
+            await ensure_index(coll, [(field, 1), ("created_at", -1), ("_id", -1)], name=f"{base}_created_id")
+            await _drop_index_if_exists(coll, superseded)
         await ensure_index(coll, [("cuil", 1)], name="ix_hce_cuil")
-        await ensure_index(coll, [("patient.dni", 1)], name="ix_hce_patientdot_dni")
-        await ensure_index(coll, [("paciente.dni", 1)], name="ix_hce_pacientedot_dni")
         await ensure_index(coll, [("text", "text")], name="ix_hce_text_es", default_language="spanish")
-        await ensure_index(coll, [("created_at", -1)], name="ix_hce_created_at")
+        # Orden global (created_at, _id) de los find_one sin filtro de identidad
+        await ensure_index(coll, [("created_at", -1), ("_id", -1)], name="ix_hce_created_id")
+        await _drop_index_if_exists(coll, "ix_hce_created_at")
 
     # EPC principal
     epc = db["epc_docs"]
@@ -145,6 +165,8 @@ async def ensure_indexes() -> None:
     ev = db["epc_versions"]
     await ensure_index(ev, [("epc_id", 1), ("generated_at", -1)], name="ix_epcv_epc_generated")
     await ensure_index(ev, [("patient_id", 1), ("generated_at", -1)], name="ix_epcv_patient_generated")
+    # list_epc_versions ordena por created_at (campo que escribe generate_epc)
+    await ensure_index(ev, [("epc_id", 1), ("created_at", -1)], name="ix_epcv_epc_created")
     
     # FERRO D2 v3.0.0: TTL indexes for fire & forget collections
     # Logs - 30 days retention
@@ -159,6 +181,10 @@ async def ensure_indexes() -> None:
     llm_usage = db["llm_usage"]
     await ensure_index(llm_usage, [("timestamp", 1)], name="ix_llm_usage_ttl", expireAfterSeconds=7776000)
     
+    # Reglas aprendidas: deduplicación por prefijo normalizado
+    learning_rules = db["learning_rules"]
+    await ensure_index(learning_rules, [("section", 1), ("text_key", 1)], name="ix_learning_rules_section_textkey")
+
     # EPC Feedback — PERMANENT storage, NO TTL (data must NEVER expire)
     epc_feedback = db["epc_feedback"]
     # Drop any existing TTL index that was auto-deleting data
@@ -59,6 +59,8 @@ class Settings(BaseSettings):
     # Misc
     ENV: str = "dev"
     EPC_FALLBACK_ANY_HCE: bool = True  # habilita estrategia ANY en generate()
+    EPC_HCE_CANONICAL_IDS: bool = False  # HCE normalizados (backfill_hce_patient_id): busca solo por patient_id
+    EPC_VERSION_FAST_WRITE: bool = False  # epc_versions con w=1, j=False (regenerables; menos latencia en generate)
 
     # Qdrant (Vector DB for RAG - Semantic Layer)
     QDRANT_HOST: str = "localhost"
@@ -0,0 +1,27 @@
+"""add_epc_events_epc_id_at_index
+
+Revision ID: d41e7c2a9b10
+Revises: a352f64b3cff
+Create Date: 2026-10-17 10:12:44.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41e7c2a9b10'
+down_revision: Union[str, Sequence[str], None] = 'a352f64b3cff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add composite (epc_id, at) index to epc_events for history lookups."""
+    op.create_index('ix_epc_events_epc_id_at', 'epc_events', ['epc_id', 'at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove composite (epc_id, at) index from epc_events."""
+    op.drop_index('ix_epc_events_epc_id_at', table_name='epc_events')
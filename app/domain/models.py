@@ -1,5 +1,5 @@
 # app/domain/models.py
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Boolean
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Boolean, Index
 # Removed mysql specific dialects
 from sqlalchemy.sql import func, text
 from sqlalchemy.orm import relationship
@@ -142,6 +142,10 @@ class EPCEvent(Base):
     No se pone FK a la tabla epc para no acoplarse a que exista siempre el registro en SQL.
     """
     __tablename__ = "epc_events"
+    __table_args__ = (
+        # get_epc_history: WHERE epc_id = ? ORDER BY at DESC
+        Index("ix_epc_events_epc_id_at", "epc_id", "at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     epc_id = Column(String(36), nullable=False)
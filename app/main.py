@@ -122,6 +122,13 @@ async def _startup():
     await ensure_indexes()
 
 
+@app.on_event("shutdown")
+async def _shutdown():
+    # Cerrar el pool HTTP compartido de Gemini
+    from app.services.ai_gemini_service import close_http_client
+    await close_http_client()
+
+
 @app.get("/")
 def root():
     return {"ok": True, "service": "EPC Suite"}
\ No newline at end of file
@@ -1,6 +1,7 @@
 # app/repositories/hce_repo.py
 from typing import Optional, Dict, Any
 from app.adapters.mongo_client import db as mongo_db
+from app.services.hce_identity import normalize_hce_identity
 
 class HceRepo:
     def __init__(self):
@@ -8,5 +9,5 @@ class HceRepo:
 
     async def save_text(self, patient_id: str, text: str, meta: Optional[Dict[str, Any]] = None) -> str:
         doc = {"patient_id": patient_id, "text": text, "meta": meta or {}}
-        res = await self.col.insert_one(doc)
+        res = await self.col.insert_one(normalize_hce_identity(doc))
         return str(res.inserted_id)
\ No newline at end of file
@@ -1,13 +1,16 @@
 # app/routers/epc.py
 from __future__ import annotations
 
+import asyncio
 import json
 import re
+import time
+import traceback
 import uuid
 import logging
 import hashlib
 from datetime import datetime, date
-from typing import Any, Dict, Optional, List
+from typing import Any, Callable, Dict, Optional, List
 from uuid import UUID
 
 from bson import ObjectId
@@ -15,6 +18,7 @@ from bson.binary import Binary, UUID_SUBTYPE
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import Response
 from pydantic import BaseModel
+from pymongo import ReturnDocument, WriteConcern
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_db, get_current_user
@@ -28,6 +32,14 @@ from app.adapters.mongo_client import (
 from app.core.config import settings
 from app.services.ai_gemini_service import GeminiAIService
 from app.services.epc_history import log_epc_event, get_epc_history
+from app.services.hce_identity import canonical_patient_id
+from app.services.hce_json_parser import categorize_procedure, generate_epc_from_json
+from app.services.epc_section_generator import generate_epc_by_sections
+from app.services.epc_pre_validator import get_epc_pre_validator
+from app.services.hce_ainstein_parser import HCEAinsteinParser
+from app.services.ai_langchain_service import _load_section_dictionary, _post_process_epc_result
+from app.services.golden_rules_service import get_golden_rules_for_prompt
+from app.services.redis_cache import get_redis_cache
 from app.utils.epc_pdf import build_epicrisis_pdf
 
 # =============================================================================
@@ -263,7 +275,6 @@ def _extract_ainstein_text(hce_doc: Dict[str, Any]) -> str:
         # Procedimientos
         procedimientos = entrada.get("indicacionProcedimientos") or []
         if procedimientos:
-            from app.services.hce_json_parser import categorize_procedure
             proc_texts = []
             for p in procedimientos:
                 if isinstance(p, dict) and p.get("procDescripcion"):
@@ -357,6 +368,20 @@ def _extract_hce_text(hce_doc: Dict[str, Any]) -> str:
     return text
 
 
+# Clave solo en memoria (el HCE no se vuelve a persistir) con el texto ya extraído
+_HCE_TEXT_MEMO_KEY = "_hce_text_cache"
+
+
+def _hce_text_memo(hce_doc: Dict[str, Any]) -> str:
+    """_extract_hce_text memoizado sobre el propio documento: la búsqueda valida el
+    texto del HCE y el endpoint vuelve a necesitarlo en el mismo request."""
+    text = hce_doc.get(_HCE_TEXT_MEMO_KEY)
+    if text is None:
+        text = _extract_hce_text(hce_doc)
+        hce_doc[_HCE_TEXT_MEMO_KEY] = text
+    return text
+
+
 def _join_texts(docs: List[Dict[str, Any]]) -> str:
     texts: List[str] = []
     for d in docs:
@@ -366,13 +391,23 @@ def _join_texts(docs: List[Dict[str, Any]]) -> str:
     return "\n\n".join(texts).strip()
 
 
+_PAT_BRACES = re.compile(r"[{}]")
+
+# Salida del modelo: orjson si está instalado, si no el json de la librería estándar
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover
+    _json_loads = json.loads
+
+
 def _json_from_ai(s: Any) -> Dict[str, Any]:
     """Normaliza la salida del modelo a un dict JSON.
 
     - Si ya viene un dict, lo devuelve tal cual.
     - Si viene vacío / None -> {}.
     - Si viene string, intenta:
-        1) json.loads directo
+        1) parseo JSON directo (orjson si está instalado)
         2) si falla, buscar el primer objeto {...} balanceando llaves.
     """
     if isinstance(s, dict):
@@ -389,23 +424,24 @@ def _json_from_ai(s: Any) -> Dict[str, Any]:
 
     s = s.strip()
     try:
-        return json.loads(s)
+        return _json_loads(s)
     except Exception:
         pass
 
     start = s.find("{")
     if start == -1:
         return {}
+    # Solo se visitan las llaves (búsqueda en C), no cada carácter de la salida
     depth = 0
-    for i, ch in enumerate(s[start:], start=start):
-        if ch == "{":
+    for m in _PAT_BRACES.finditer(s, start):
+        if m.group() == "{":
             depth += 1
-        elif ch == "}":
+        else:
             depth -= 1
             if depth == 0:
-                frag = s[start : i + 1]
+                frag = s[start : m.end()]
                 try:
-                    return json.loads(frag)
+                    return _json_loads(frag)
                 except Exception:
                     return {}
     return {}
@@ -722,13 +758,41 @@ def _sync_estado_sql(
 # -----------------------------------------------------------------------------
 # HCE: descubrimiento de colecciones
 # -----------------------------------------------------------------------------
+# Colecciones HCE descubiertas: cambian muy rara vez, se cachean por proceso
+_HCE_COLLECTIONS_TTL_S = 300.0
+_hce_collections_cache: Optional[tuple] = None  # (expira_en, colecciones)
+_hce_collections_lock = asyncio.Lock()
+
+
 async def _discover_hce_collections(limit: Optional[int] = None):
     """
     Lista HCE combinando:
     - pick_hce_collections()
     - colecciones cuyo nombre contenga 'hce' (case-insensitive)
       excluyendo 'epc_docs' y 'epc_versions'.
+
+    El resultado se cachea _HCE_COLLECTIONS_TTL_S segundos para no listar
+    colecciones en cada generación de EPC.
     """
+    global _hce_collections_cache
+
+    cached = _hce_collections_cache
+    if cached is None or cached[0] <= time.monotonic():
+        async with _hce_collections_lock:
+            cached = _hce_collections_cache
+            if cached is None or cached[0] <= time.monotonic():
+                combined, complete = await _list_hce_collections()
+                cached = (time.monotonic() + _HCE_COLLECTIONS_TTL_S, combined)
+                if complete:
+                    _hce_collections_cache = cached
+
+    combined = cached[1]
+    if limit is not None:
+        return combined[:limit]
+    return list(combined)
+
+
+async def _list_hce_collections():
     static_colls = await pick_hce_collections()
     static_names = {c.name for c in static_colls}
 
@@ -744,10 +808,8 @@ async def _discover_hce_collections(limit: Optional[int] = None):
             dyn_names.append(name)
 
     extra = [mongo[name] for name in dyn_names if name not in static_names]
-    combined = static_colls + extra
-    if limit is not None:
-        return combined[:limit]
-    return combined
+    # Sin listado (error o DB vacía) no se cachea: se reintenta en la próxima llamada
+    return static_colls + extra, bool(existing)
 
 
 async def _find_hce_by_id(hce_id: str) -> Optional[Dict[str, Any]]:
@@ -764,90 +826,203 @@ async def _find_hce_by_id(hce_id: str) -> Optional[Dict[str, Any]]:
 def _has_useful_hce_text(hce: Optional[Dict[str, Any]]) -> bool:
     if not hce:
         return False
-    t = _extract_hce_text(hce) or ""
+    t = _hce_text_memo(hce) or ""
     min_chars = int(getattr(settings, "EPC_HCE_MIN_TEXT_CHARS", 80))
     return len(t.strip()) >= min_chars
 
 
+# Campos alternativos donde las integraciones guardan paciente / admisión / DNI
+_HCE_PATIENT_FIELDS = ("patient_id", "patient.id", "patientId", "paciente_id", "paciente.id")
+_HCE_ADMISSION_FIELDS = ("admission_id", "admission.id", "admision_id", "admision.id", "admissionId")
+_HCE_DNI_FIELDS = ("dni", "patient.dni", "paciente.dni")
+
+# Documentos por lote al recorrer los HCE de un paciente. El recorrido trae
+# solo los campos de identidad; el HCE completo (puede pesar varios MB) se lee
+# por _id únicamente para el candidato de cada etapa.
+_HCE_SCAN_BATCH = 50
+_HCE_IDENTITY_PROJECTION: Dict[str, int] = {
+    f: 1 for f in _HCE_PATIENT_FIELDS + _HCE_ADMISSION_FIELDS + _HCE_DNI_FIELDS + ("created_at",)
+}
+
+
+def _doc_path_values(doc: Dict[str, Any], path: str) -> List[Any]:
+    """Valores en `path` (con puntos) resueltos como Mongo: atraviesa listas de subdocumentos."""
+    current: List[Any] = [doc]
+    for part in path.split("."):
+        nxt: List[Any] = []
+        for node in current:
+            if isinstance(node, dict):
+                if part in node:
+                    nxt.append(node[part])
+            elif isinstance(node, list):
+                nxt.extend(item[part] for item in node if isinstance(item, dict) and part in item)
+        current = nxt
+    return current
+
+
+def _decoded_variants(variants: List[Any]) -> List[Any]:
+    """
+    Variantes de query tal como llegan decodificadas desde Mongo: el cliente
+    usa uuidRepresentation="standard", así que Binary subtype 4 -> UUID.
+    """
+    out: List[Any] = []
+    for v in variants:
+        if isinstance(v, Binary) and v.subtype == UUID_SUBTYPE:
+            out.append(UUID(bytes=bytes(v)))
+        else:
+            out.append(v)
+    return out
+
+
+def _doc_matches(doc: Dict[str, Any], fields: tuple, targets: List[Any]) -> bool:
+    """Equivalente en memoria de {"$or": [{f: t} for f in fields for t in targets]}."""
+    for f in fields:
+        for val in _doc_path_values(doc, f):
+            if any(val == t and type(val) is type(t) for t in targets):
+                return True
+            if isinstance(val, list) and any(
+                x == t and type(x) is type(t) for x in val for t in targets
+            ):
+                return True
+    return False
+
+
+class _HCEIdentityScan:
+    """
+    Recorre una sola vez (de a lotes, del más reciente al más antiguo) los HCE
+    de una colección que matchean cualquier criterio de identidad y recuerda el
+    primero que cumple cada etapa. Equivale a un find_one ordenado por etapa,
+    pero con un único cursor por colección.
+    """
+
+    def __init__(self, coll, query: Dict[str, Any], stages: List[Any]):
+        self._coll = coll
+        self._cursor = coll.find(
+            query, _HCE_IDENTITY_PROJECTION, sort=[("created_at", -1), ("_id", -1)]
+        ).batch_size(_HCE_SCAN_BATCH)
+        self._stages = stages
+        self._first: List[Optional[Dict[str, Any]]] = [None] * len(stages)
+        self._exhausted = False
+
+    async def first_match(self, stage: int) -> Optional[Dict[str, Any]]:
+        while self._first[stage] is None and not self._exhausted:
+            batch = await self._cursor.to_list(length=_HCE_SCAN_BATCH)
+            if not batch:
+                self._exhausted = True
+                break
+            for doc in batch:
+                for i, matches in enumerate(self._stages):
+                    if self._first[i] is None and matches(doc):
+                        self._first[i] = doc
+        return self._first[stage]
+
+    async def full_doc(self, candidate: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """HCE completo de un candidato (el recorrido solo trae campos de identidad)."""
+        return await self._coll.find_one({"_id": candidate["_id"]})
+
+    async def close(self) -> None:
+        if not self._exhausted:
+            await self._cursor.close()
+
+
+async def _scan_identity_stages(
+    colls: List[Any], identity_or: List[Dict[str, Any]], stages: List[Any]
+) -> Optional[Dict[str, Any]]:
+    """Primer HCE con texto útil por etapa (en orden), con un cursor $or por colección."""
+    if not identity_or:
+        return None
+    scans = [_HCEIdentityScan(c, {"$or": identity_or}, stages) for c in colls]
+    try:
+        for stage in range(len(stages)):
+            # Candidatos (solo identidad) de todas las colecciones en paralelo; el
+            # documento completo se trae solo para el primero en orden de prioridad
+            # y, si no tiene texto útil, para el siguiente
+            candidates = await asyncio.gather(*(scan.first_match(stage) for scan in scans))
+            for scan, candidate in zip(scans, candidates):
+                if candidate is None:
+                    continue
+                doc = await scan.full_doc(candidate)
+                if doc and _has_useful_hce_text(doc):
+                    return doc
+    finally:
+        await asyncio.gather(*(scan.close() for scan in scans))
+    return None
+
+
 async def _find_latest_hce_for_patient(
     patient_id: str,
     admission_id: Optional[str] = None,
     dni: Optional[str] = None,
     allow_any: bool = True,
+    dni_loader: Optional[Callable[[], Optional[str]]] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     Busca HCE del paciente de forma robusta (string + UUID Binary subtype=4)
     y con campos alternativos típicos de integraciones.
 
+    Etapas (en orden de prioridad, cada una sobre todas las colecciones):
+    1) patient_id + admisión, 2) solo patient_id, 3) por DNI. Las tres se
+    resuelven con una única consulta $or por colección; cada etapa toma el HCE
+    más reciente que la cumple, como un find_one por etapa.
+
+    dni_loader: alternativa a `dni` para cuando obtenerlo cuesta una consulta
+    (paciente en SQL); solo se invoca si las etapas 1 y 2 no encuentran HCE.
+
     allow_any: ÚLTIMO fallback. Si está habilitado, solo toma HCE "sin asignar"
     para evitar agarrar HCE de otro paciente y generar EPC repetida.
     """
     colls = await _discover_hce_collections(limit=50)
 
-    pvars = _uuid_variants(patient_id)
+    if getattr(settings, "EPC_HCE_CANONICAL_IDS", False):
+        # HCE normalizados al ingresar: una sola igualdad indexada sobre patient_id
+        canonical = canonical_patient_id(patient_id)
+        pvars = [canonical] if canonical else []
+        patient_fields: tuple = ("patient_id",)
+    else:
+        pvars = _uuid_variants(patient_id)
+        patient_fields = _HCE_PATIENT_FIELDS
     avars = _uuid_variants(admission_id) if admission_id else []
+    dni = str(dni).strip() if dni else ""
 
-    patient_or: List[Dict[str, Any]] = []
-    for v in pvars:
-        patient_or += [
-            {"patient_id": v},
-            {"patient.id": v},
-            {"patientId": v},
-            {"paciente_id": v},
-            {"paciente.id": v},
-        ]
+    # Una cláusula $in por campo (no campo x variante): cotas de índice más ajustadas
+    patient_or: List[Dict[str, Any]] = [{f: {"$in": pvars}} for f in patient_fields] if pvars else []
+    dni_or: List[Dict[str, Any]] = [{f: dni} for f in _HCE_DNI_FIELDS] if dni else []
 
-    # 1) por patient_id + admisión
-    if admission_id and avars:
-        adm_or: List[Dict[str, Any]] = []
-        for av in avars:
-            adm_or += [
-                {"admission_id": av},
-                {"admission.id": av},
-                {"admision_id": av},
-                {"admision.id": av},
-                {"admissionId": av},
-            ]
+    ptargets = _decoded_variants(pvars)
+    atargets = _decoded_variants(avars)
 
-        for c in colls:
-            doc = await c.find_one(
-                {"$and": [{"$or": patient_or}, {"$or": adm_or}]},
-                sort=[("created_at", -1), ("_id", -1)],
-            )
-            if doc and _has_useful_hce_text(doc):
-                return doc
+    def _is_patient(doc: Dict[str, Any]) -> bool:
+        return _doc_matches(doc, patient_fields, ptargets)
 
+    stages: List[Any] = []
+    # 1) por patient_id + admisión
+    if admission_id and avars:
+        stages.append(lambda d: _is_patient(d) and _doc_matches(d, _HCE_ADMISSION_FIELDS, atargets))
     # 2) solo patient_id
-    for c in colls:
-        doc = await c.find_one(
-            {"$or": patient_or},
-            sort=[("created_at", -1), ("_id", -1)],
-        )
-        if doc and _has_useful_hce_text(doc):
-            return doc
-
+    stages.append(_is_patient)
     # 3) por dni
-    if dni:
-        dni = str(dni).strip()
+    if dni_or:
+        stages.append(lambda d: _doc_matches(d, _HCE_DNI_FIELDS, [dni]))
+
+    doc = await _scan_identity_stages(colls, patient_or + dni_or, stages)
+    if doc:
+        return doc
+
+    if not dni and dni_loader is not None:
+        dni = str(dni_loader() or "").strip()
         if dni:
-            dni_or = [{"dni": dni}, {"patient.dni": dni}, {"paciente.dni": dni}]
-            for c in colls:
-                doc = await c.find_one(
-                    {"$or": dni_or},
-                    sort=[("created_at", -1), ("_id", -1)],
-                )
-                if doc and _has_useful_hce_text(doc):
-                    return doc
+            doc = await _scan_identity_stages(
+                colls,
+                [{f: dni} for f in _HCE_DNI_FIELDS],
+                [lambda d: _doc_matches(d, _HCE_DNI_FIELDS, [dni])],
+            )
+            if doc:
+                return doc
 
     # 4) fallback ANY (solo sin asignar) -> evita EPC repetida por HCE ajena
     if allow_any:
-        unassigned = {
-            "$or": [
-                {"patient_id": {"$exists": False}},
-                {"patient_id": ""},
-                {"patient_id": None},
-            ]
-        }
+        # null cubre también el campo ausente; usa ix_hce_patient_created_id
+        unassigned = {"patient_id": {"$in": [None, ""]}}
         has_text = {
             "$or": [
                 {"text": {"$exists": True, "$type": "string", "$ne": ""}},
@@ -855,11 +1030,19 @@ async def _find_latest_hce_for_patient(
                 {"content": {"$exists": True, "$type": "string", "$ne": ""}},
             ]
         }
-        for c in colls:
-            doc = await c.find_one(
+        # Solo _id en paralelo; los documentos completos, de a uno y en orden
+        found = await asyncio.gather(*(
+            c.find_one(
                 {"$and": [unassigned, has_text]},
+                {"_id": 1},
                 sort=[("created_at", -1), ("_id", -1)],
             )
+            for c in colls
+        ))
+        for c, candidate in zip(colls, found):
+            if candidate is None:
+                continue
+            doc = await c.find_one({"_id": candidate["_id"]})
             if doc and _has_useful_hce_text(doc):
                 return doc
 
@@ -874,6 +1057,21 @@ class OpenEPCRequest(BaseModel):
     admission_id: Optional[str] = None
 
 
+# Campos de la EPC que necesitan los endpoints de generación (sin "generated",
+# que puede pesar decenas de KB y se reemplaza al generar)
+_EPC_META_PROJECTION = {"patient_id": 1, "admission_id": 1}
+
+
+async def _get_epc_meta(epc_id: str) -> Optional[Dict[str, Any]]:
+    return await mongo.epc_docs.find_one({"_id": epc_id}, _EPC_META_PROJECTION)
+
+
+def _patient_dni(db: Session, patient_id: str) -> Optional[str]:
+    """DNI del paciente (consulta SQL): solo hace falta para la etapa 3 de la búsqueda de HCE."""
+    preg = PatientRepo(db).get(patient_id)
+    return getattr(preg, "dni", None) if preg else None
+
+
 def _epc_out(doc: Dict[str, Any]) -> Dict[str, Any]:
     if not doc:
         return {}
@@ -971,7 +1169,7 @@ async def stream_epc_generation(
     from fastapi.responses import StreamingResponse
     import asyncio
     
-    epc_doc = await mongo.epc_docs.find_one({"_id": epc_id})
+    epc_doc = await _get_epc_meta(epc_id)
     if not epc_doc:
         raise HTTPException(status_code=404, detail="EPC no encontrado")
     
@@ -989,15 +1187,11 @@ async def stream_epc_generation(
             if hce_id:
                 hce = await _find_hce_by_id(hce_id)
             else:
-                dni = None
-                preg = PatientRepo(db).get(patient_id)
-                if preg and getattr(preg, "dni", None):
-                    dni = preg.dni
                 hce = await _find_latest_hce_for_patient(
                     patient_id=patient_id,
                     admission_id=epc_doc.get("admission_id"),
-                    dni=dni,
                     allow_any=False,
+                    dni_loader=lambda: _patient_dni(db, patient_id),
                 )
             
             if not hce:
@@ -1007,7 +1201,7 @@ async def stream_epc_generation(
             yield f"data: {json.dumps({'status': 'processing', 'message': 'HCE localizada, procesando...'})}\n\n"
             
             # Extract text
-            hce_text = _extract_hce_text(hce)
+            hce_text = _hce_text_memo(hce)
             if not hce_text or len(hce_text.strip()) < 80:
                 yield f"data: {json.dumps({'status': 'error', 'message': 'Texto HCE insuficiente'})}\n\n"
                 return
@@ -1069,6 +1263,56 @@ async def stream_epc_generation(
 # -----------------------------------------------------------------------------
 # Generar EPC desde IA (Gemini) usando HCE como fuente
 # -----------------------------------------------------------------------------
+# Write concern opcional para epc_versions (EPC_VERSION_FAST_WRITE): la versión
+# se puede regenerar, así que se acepta el ack del primario sin esperar al journal.
+_EPC_VERSIONS_FAST_WC = WriteConcern(w=1, j=False)
+
+# Prompt del fallback de generate_epc (si falla el generador por secciones/JSON)
+_FALLBACK_EPC_PROMPT = """Analiza el siguiente texto de HCE y genera una EPICRISIS en JSON.
+Campos: motivo_internacion, evolucion, procedimientos (lista), interconsultas (lista), 
+medicacion (lista con tipo/farmaco/dosis/via/frecuencia), indicaciones_alta, notas_alta.
+HCE: \"\"\"{hce_text}\"\"\""""
+
+async def _epc_cache_fingerprint(
+    hce: Dict[str, Any],
+    hce_sha: str,
+    is_json_hce: bool,
+    tenant_id: Optional[str],
+    db: Session,
+) -> str:
+    """
+    Huella de todo lo que determina el resultado cacheado: contenido de la HCE
+    (el JSON completo si es estructurada), generador, modelo, Golden Rules,
+    diccionario de secciones y, en el parser JSON, exclusiones del tenant.
+    """
+    golden_rules, dictionary_rules = await asyncio.gather(
+        get_golden_rules_for_prompt(),
+        _load_section_dictionary(),
+    )
+    h = hashlib.sha256()
+    if is_json_hce:
+        from app.services.tenant_rules_service import get_excluded_sections_for_tenant, DEFAULT_EXCLUDED_SECTIONS
+
+        excluded = get_excluded_sections_for_tenant(db, tenant_id) if tenant_id else DEFAULT_EXCLUDED_SECTIONS
+        h.update(json.dumps(hce.get("ainstein"), sort_keys=True, default=str, ensure_ascii=False).encode("utf-8", errors="ignore"))
+        h.update(json.dumps(sorted(excluded or []), default=str).encode("utf-8"))
+    else:
+        h.update(hce_sha.encode("ascii"))
+    h.update(f"{'json' if is_json_hce else 'text'}:{settings.GEMINI_MODEL}".encode("utf-8"))
+    h.update((golden_rules or "").encode("utf-8", errors="ignore"))
+    h.update(json.dumps(dictionary_rules, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8", errors="ignore"))
+    return h.hexdigest()
+
+
+# Generaciones en curso por (epc_id, hce_id, force, tenant, usuario): reintentos o
+# doble click concurrentes esperan el mismo resultado en lugar de repetir
+# búsqueda de HCE + llamadas a IA.
+_generate_inflight: Dict[tuple, asyncio.Future] = {}
+# Resultado de una generación abandonada (request dueño cancelado): quien
+# esperaba la vuelve a intentar por su cuenta
+_GENERATE_ABANDONED = object()
+
+
 @router.post(
     "/{epc_id}/generate",
     summary="Genera contenido de EPC usando IA y HCE",
@@ -1076,10 +1320,53 @@ async def stream_epc_generation(
 async def generate_epc(
     epc_id: str,
     hce_id: Optional[str] = Query(default=None, description="Forzar la HCE a usar (_id de Mongo)"),
+    force: bool = Query(default=False, description="Regenerar con IA aunque haya resultado en caché"),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    epc_doc = await mongo.epc_docs.find_one({"_id": epc_id})
+    key = (
+        epc_id,
+        hce_id or "",
+        force,
+        str(getattr(user, "tenant_id", None) or ""),
+        str(user.id),
+    )
+    while True:
+        inflight = _generate_inflight.get(key)
+        if inflight is None:
+            break
+        log.info("[generate_epc] EPC=%s ya se está generando; se espera ese resultado", epc_id)
+        result = await asyncio.shield(inflight)
+        if result is not _GENERATE_ABANDONED:
+            return result
+
+    # Sin await entre el get y el alta: el registro es atómico en el event loop
+    fut = asyncio.get_running_loop().create_future()
+    _generate_inflight[key] = fut
+    try:
+        result = await _generate_epc(epc_id, hce_id, db, user, force=force)
+    except Exception as exc:
+        fut.set_exception(exc)
+        fut.exception()  # marcar como consumida aunque no haya otros requests esperando
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        if not fut.done():
+            # Cancelación del dueño: no se propaga a los que esperan, que reintentan
+            fut.set_result(_GENERATE_ABANDONED)
+        _generate_inflight.pop(key, None)
+
+
+async def _generate_epc(
+    epc_id: str,
+    hce_id: Optional[str],
+    db: Session,
+    user: User,
+    force: bool = False,
+) -> Dict[str, Any]:
+    epc_doc = await _get_epc_meta(epc_id)
     if not epc_doc:
         raise HTTPException(status_code=404, detail="EPC no encontrado")
 
@@ -1099,17 +1386,12 @@ async def generate_epc(
         if not _has_useful_hce_text(hce):
             raise HTTPException(status_code=422, detail="HCE encontrada pero sin texto clínico útil")
     else:
-        dni = None
-        preg = PatientRepo(db).get(patient_id)
-        if preg and getattr(preg, "dni", None):
-            dni = preg.dni
-
         allow_any = bool(getattr(settings, "EPC_FALLBACK_ANY_HCE", False))
         hce = await _find_latest_hce_for_patient(
             patient_id=patient_id,
             admission_id=admission_id,
-            dni=dni,
             allow_any=allow_any,
+            dni_loader=lambda: _patient_dni(db, patient_id),
         )
 
         if not hce:
@@ -1183,7 +1465,7 @@ async def generate_epc(
     # ------------------------------------------------------------------
     # 2) Construir texto de entrada para IA
     # ------------------------------------------------------------------
-    hce_text = _extract_hce_text(hce) if hce else ""
+    hce_text = _hce_text_memo(hce) if hce else ""
     hce_text = (hce_text or "").strip()
     min_chars = int(getattr(settings, "EPC_HCE_MIN_TEXT_CHARS", 80))
 
@@ -1219,21 +1501,39 @@ async def generate_epc(
             hce.get("ainstein", {}).get("historia")
         )
         
-        if is_json_hce:
+        # Obtener tenant_id del usuario para aplicar reglas de visualización
+        tenant_id = str(user.tenant_id) if hasattr(user, 'tenant_id') and user.tenant_id else None
+
+        # FERRO D2: Redis-first cache lookup (misma HCE + generador + modelo + reglas);
+        # force=True regenera siempre y reemplaza la entrada cacheada. Sin Redis
+        # no se calcula la huella (lee reglas y serializa la HCE completa).
+        cache = get_redis_cache()
+        cache_key = None
+        data = None
+        if cache.is_available:
+            cache_key = cache.epc_cache_key(
+                tenant_id or "global",
+                str(patient_id),
+                await _epc_cache_fingerprint(hce, hce_sha, is_json_hce, tenant_id, db),
+            )
+            if not force:
+                data = await cache.get(cache_key)
+        cache_hit = bool(data)
+
+        if cache_hit:
+            log.info("[generate_epc] Cache HIT (hce_sha=%s), se omite la generación con IA", hce_sha)
+        elif is_json_hce:
             # Usar parser JSON estructurado
-            from app.services.hce_json_parser import generate_epc_from_json
-            
-            # Obtener tenant_id del usuario para aplicar reglas de visualización
-            tenant_id = str(user.tenant_id) if hasattr(user, 'tenant_id') and user.tenant_id else None
-            
             log.info(f"[generate_epc] Detectado HCE JSON estructurado, usando parser JSON (tenant_id={tenant_id})")
             data = await generate_epc_from_json(hce, patient_id, tenant_id=tenant_id, db=db)
         else:
             # Usar parser de texto plano
-            from app.services.epc_section_generator import generate_epc_by_sections
-            
             log.info("[generate_epc] Usando generador por secciones (texto plano)")
             data = await generate_epc_by_sections(hce_text, patient_id)
+
+        if data and cache_key and not cache_hit:
+            # FERRO D2: Cache store; el post-procesamiento de abajo se aplica igual en cada request
+            await cache.set(cache_key, data, ttl=cache.TTL_EPC_CACHE)
         
         # Extraer campos del resultado
         motivo = data.get("motivo_internacion", "") or ""
@@ -1261,16 +1561,12 @@ async def generate_epc(
         
         # ⚠️ POST-PROCESAMIENTO: Detectar óbito desde tipo_alta del episodio
         try:
-            from app.services.epc_pre_validator import EPCPreValidator
-            from app.services.hce_ainstein_parser import HCEAinsteinParser
-            
             # Parsear HCE para obtener tipo_alta
             parser = HCEAinsteinParser()
             parsed_hce = parser.parse_from_ainstein(hce)
             
             # Validar
-            validator = EPCPreValidator()
-            validation = validator.validate(parsed_hce)
+            validation = get_epc_pre_validator().validate(parsed_hce)
             
             if validation.is_obito:
                 log.info(f"[generate_epc] ⚠️ ÓBITO detectado: tipo_alta={validation.tipo_alta_oficial}")
@@ -1280,7 +1576,6 @@ async def generate_epc(
                 notas_alta = []
                 
                 # Post-procesar evolución para remover contradicciones
-                from app.services.ai_langchain_service import _post_process_epc_result
                 post_result = _post_process_epc_result({
                     "evolucion": evolucion,
                     "indicaciones_alta": indicaciones_alta,
@@ -1298,15 +1593,11 @@ async def generate_epc(
         
     except Exception as section_err:
         log.warning(f"[generate_epc] Falló generador: {section_err}, usando fallback")
-        import traceback
         traceback.print_exc()
         
         # Fallback al método anterior
         ai = GeminiAIService()
-        prompt = f"""Analiza el siguiente texto de HCE y genera una EPICRISIS en JSON.
-Campos: motivo_internacion, evolucion, procedimientos (lista), interconsultas (lista), 
-medicacion (lista con tipo/farmaco/dosis/via/frecuencia), indicaciones_alta, notas_alta.
-HCE: \"\"\"{hce_text[:12000]}\"\"\""""
+        prompt = _FALLBACK_EPC_PROMPT.format(hce_text=hce_text[:12000])
         
         raw = await ai.generate_epc(prompt)
         data = _json_from_ai(raw) or {}
@@ -1323,7 +1614,7 @@ HCE: \"\"\"{hce_text[:12000]}\"\"\""""
     # ------------------------------------------------------------------
     # 3) Normalizar interconsultas (compatibilidad)
     # ------------------------------------------------------------------
-    ts = _now().isoformat() + "Z"
+    ts = _now().isoformat().replace("+00:00", "Z")
     
     # Convertir interconsultas a strings si son dicts
     interconsultas_detalle: List[Dict[str, Any]] = []
@@ -1439,7 +1730,12 @@ HCE: \"\"\"{hce_text[:12000]}\"\"\""""
         "source": "ai_generate",
         "generated": generated_doc,
     }
-    await mongo.epc_versions.insert_one(version_doc)
+    versions = (
+        mongo.epc_versions.with_options(write_concern=_EPC_VERSIONS_FAST_WC)
+        if getattr(settings, "EPC_VERSION_FAST_WRITE", False)
+        else mongo.epc_versions
+    )
+    await versions.insert_one(version_doc)
 
     actor = _actor_name(user)
     try:
@@ -1467,7 +1763,11 @@ async def get_epc(epc_id: str):
 
 @router.get("/{epc_id}/versions")
 async def list_epc_versions(epc_id: str):
-    cursor = mongo.epc_versions.find({"epc_id": epc_id}).sort("created_at", -1)
+    # Solo metadatos: "generated" completo puede pesar decenas de KB por versión
+    cursor = mongo.epc_versions.find(
+        {"epc_id": epc_id},
+        {"created_at": 1, "source": 1, "generated.provider": 1, "generated.model": 1},
+    ).sort("created_at", -1).batch_size(200)
     items: List[Dict[str, Any]] = []
     async for d in cursor:
         items.append(
@@ -1620,7 +1920,7 @@ async def get_epc_context(
             allow_any=bool(getattr(settings, "EPC_FALLBACK_ANY_HCE", False)),
         )
 
-    hce_text = _extract_hce_text(hce) if hce else ""
+    hce_text = _hce_text_memo(hce) if hce else ""
 
     patient_out: Optional[Dict[str, Any]] = None
     if patient:
@@ -1830,9 +2130,12 @@ async def update_epc(
         return _epc_out(doc)
 
     updates["updated_at"] = _now()
-    await mongo.epc_docs.update_one({"_id": epc_id}, {"$set": updates})
-
-    new_doc = await mongo.epc_docs.find_one({"_id": epc_id}) or doc
+    # Un solo round-trip: actualiza y devuelve el documento resultante
+    new_doc = await mongo.epc_docs.find_one_and_update(
+        {"_id": epc_id},
+        {"$set": updates},
+        return_document=ReturnDocument.AFTER,
+    ) or doc
 
     actor = _actor_name(user)
     try:
@@ -3336,7 +3639,8 @@ async def get_epc_dashboard_control(
                 continue
             hce = await mongo.hce_docs.find_one(
                 {"patient_id": pid},
-                {"structured": 1, "ainstein.episodio": 1},
+                {"structured.fecha_ingreso": 1, "structured.fecha_egreso_original": 1, "structured.fecha_egreso": 1,
+                 "ainstein.episodio.inteFechaIngreso": 1, "ainstein.episodio.inteFechaEgreso": 1},
                 sort=[("created_at", -1)]
             )
             if hce:
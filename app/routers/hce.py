@@ -22,6 +22,7 @@ from sqlalchemy.orm import Session
 
 from app.core.deps import get_db, get_current_user
 from app.adapters.mongo_client import db as mongo
+from app.services.hce_identity import normalize_hce_identity
 from app.services.hce_parser import (
     save_upload,
     extract_text_from_hce,
@@ -279,7 +280,7 @@ async def upload_hce(
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
     }
-    ins = await mongo.hce_docs.insert_one(doc)
+    ins = await mongo.hce_docs.insert_one(normalize_hce_identity(doc))
 
     return {
         "ok": True,
@@ -673,7 +674,7 @@ async def import_ainstein_hce(
         "updated_at": datetime.utcnow(),
     }
 
-    ins = await mongo.hce_docs.insert_one(doc)
+    ins = await mongo.hce_docs.insert_one(normalize_hce_identity(doc))
     hce_id = str(ins.inserted_id)
     
     # =========================================================================
@@ -84,6 +84,12 @@ class DeathDetectionRule:
         "vivo", "consciente", "vigil", "lúcido",
     ]
     
+    # Pre-filtro: una sola pasada sobre el texto para saber si aparece algún
+    # keyword (directo o ambiguo). Sin match no puede haber detección.
+    _RE_ANY_KEYWORD = re.compile(
+        "|".join(map(re.escape, DEATH_KEYWORDS + AMBIGUOUS_KEYWORDS))
+    )
+    
     # Patrones regex para extraer fecha y hora
     DATE_PATTERNS = [
         r'(\d{1,2}/\d{1,2}/\d{4})',  # DD/MM/YYYY
@@ -113,6 +119,11 @@ class DeathDetectionRule:
         
         text_lower = text.lower()
         
+        # Caso común (evolución sin menciones de muerte): salir sin recorrer
+        # las listas keyword por keyword
+        if not self._RE_ANY_KEYWORD.search(text_lower):
+            return DeathInfo(detected=False)
+        
         # 1. Buscar palabras clave directas (alta confianza)
         detected_keyword = None
         for keyword in self.DEATH_KEYWORDS:
@@ -11,6 +11,29 @@ from app.core.config import settings
 
 log = logging.getLogger(__name__)
 
+# Cliente HTTP compartido: reutiliza conexiones TCP/TLS keep-alive entre
+# llamadas (las EPC disparan varias en paralelo) en lugar de abrir un
+# AsyncClient nuevo por request.
+_HTTP_TIMEOUT = 90
+_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Obtiene (o crea) el cliente HTTP compartido para Gemini."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Cierra el cliente HTTP compartido (shutdown de la app)."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
 
 def _safe_json(text: str) -> Optional[Dict[str, Any]]:
     """Parse JSON from LLM output, handling markdown fences and control chars."""
@@ -176,8 +199,7 @@ class GeminiAIService:
             payload["generationConfig"] = gen_config
 
             try:
-                async with httpx.AsyncClient(timeout=90) as client:
-                    resp = await client.post(url, headers=headers, json=payload)
+                resp = await _get_http_client().post(url, headers=headers, json=payload)
                 last_resp = resp
 
                 if resp.status_code == 404:
@@ -7,7 +7,9 @@ Preparado para RAG y feedback loop.
 
 from __future__ import annotations
 
+import asyncio
 import logging
+from functools import lru_cache
 from typing import Any, Dict, Optional, List
 from datetime import datetime
 
@@ -101,6 +103,29 @@ async def _load_section_dictionary() -> List[Dict[str, Any]]:
         return []
 
 
+async def _get_feedback_rules_for_prompt() -> str:
+    """Reglas de feedback insights (aprendizaje continuo); "" si no hay o falla."""
+    try:
+        from app.services.feedback_insights_service import get_prompt_rules
+        feedback_rules = await get_prompt_rules()
+        if feedback_rules:
+            log.info("[LangChainAI] Using %d chars of feedback insights rules", len(feedback_rules))
+        return feedback_rules or ""
+    except Exception as e:
+        log.warning("[LangChainAI] Could not get feedback insights: %s", e)
+        return ""
+
+
+async def _get_golden_rules_for_prompt() -> str:
+    """Golden Rules (Reglas de Oro) desde MongoDB; "" si no hay o falla."""
+    try:
+        from app.services.golden_rules_service import get_golden_rules_for_prompt
+        return await get_golden_rules_for_prompt() or ""
+    except Exception as e:
+        log.warning("[LangChainAI] Could not load Golden Rules: %s", e)
+        return ""
+
+
 def _spanish_stem(word: str) -> str:
     """
     Simple Spanish stemmer for medical/procedure terms.
@@ -322,6 +347,41 @@ def _apply_dictionary_rules(result: Dict[str, Any], dictionary_rules: List[Dict[
 async def get_section_dictionary_for_prompt() -> str:
     """Format section dictionary rules for injection into the LLM prompt."""
     rules = await _load_section_dictionary()
+    return _format_section_dictionary_for_prompt(rules)
+
+
+@lru_cache(maxsize=None)
+def _get_epc_parser():
+    """Parser JSON de EPC (sin estado): se crea en el primer uso y se comparte."""
+    from langchain_core.output_parsers import JsonOutputParser
+    return JsonOutputParser(pydantic_object=EPCGeneratedContent)
+
+
+@lru_cache(maxsize=8)
+def _get_epc_prompt_template(system_prompt: str, user_prompt: str):
+    """
+    ChatPromptTemplate de EPC, construido en el primer uso y reutilizado
+    mientras el system prompt (con las reglas inyectadas) no cambie.
+    
+    El system prompt no tiene variables: se renderiza una sola vez con
+    str.format (sólo des-escapa las llaves) y queda como mensaje fijo, así
+    LangChain no lo vuelve a parsear en cada invocación. Si las reglas
+    inyectadas traen llaves sueltas se mantiene el template original.
+    """
+    from langchain_core.messages import SystemMessage
+    from langchain_core.prompts import ChatPromptTemplate
+    try:
+        system: Any = SystemMessage(content=system_prompt.format())
+    except (KeyError, IndexError, ValueError):
+        system = ("system", system_prompt)
+    return ChatPromptTemplate.from_messages([
+        system,
+        ("human", user_prompt),
+    ])
+
+
+def _format_section_dictionary_for_prompt(rules: List[Dict[str, Any]]) -> str:
+    """Format already-loaded section dictionary rules for the LLM prompt."""
     if not rules:
         return ""
     
@@ -898,18 +958,14 @@ class LangChainAIService:
             span = span_ctx.__enter__()
             span.set_attribute("model", self.model_name)
             span.set_attribute("input_length", len(hce_text))
-        from langchain_core.prompts import ChatPromptTemplate
-        from langchain_core.output_parsers import JsonOutputParser
         
-        # Obtener reglas de feedback insights (aprendizaje continuo)
-        feedback_rules = ""
-        try:
-            from app.services.feedback_insights_service import get_prompt_rules
-            feedback_rules = await get_prompt_rules()
-            if feedback_rules:
-                log.info("[LangChainAI] Using %d chars of feedback insights rules", len(feedback_rules))
-        except Exception as e:
-            log.warning("[LangChainAI] Could not get feedback insights: %s", e)
+        # Reglas de feedback insights, Golden Rules y diccionario de secciones
+        # son lecturas independientes de MongoDB: se resuelven en paralelo.
+        feedback_rules, golden_rules, dictionary_rules = await asyncio.gather(
+            _get_feedback_rules_for_prompt(),
+            _get_golden_rules_for_prompt(),
+            _load_section_dictionary(),
+        )
         
         # Construir prompt con template
         system_prompt = self._get_epc_system_prompt()
@@ -919,41 +975,26 @@ class LangChainAIService:
             system_prompt = system_prompt + feedback_rules
         
         # 🏆 Agregar Golden Rules (Reglas de Oro) desde MongoDB
-        try:
-            from app.services.golden_rules_service import get_golden_rules_for_prompt
-            golden_rules = await get_golden_rules_for_prompt()
-            if golden_rules:
-                system_prompt = system_prompt + golden_rules
-                log.info("[LangChainAI] Golden Rules injected: %d chars", len(golden_rules))
-        except Exception as e:
-            log.warning("[LangChainAI] Could not load Golden Rules: %s", e)
+        if golden_rules:
+            system_prompt = system_prompt + golden_rules
+            log.info("[LangChainAI] Golden Rules injected: %d chars", len(golden_rules))
         
         # 📖 Agregar Diccionario de Clasificación Aprendido al prompt
-        dictionary_rules = []
-        try:
-            dictionary_rules = await _load_section_dictionary()
-            dict_prompt = await get_section_dictionary_for_prompt()
-            if dict_prompt:
-                system_prompt = system_prompt + dict_prompt
-                log.info("[LangChainAI] Section Dictionary injected: %d rules, %d chars", len(dictionary_rules), len(dict_prompt))
-        except Exception as e:
-            log.warning("[LangChainAI] Could not load Section Dictionary: %s", e)
+        dict_prompt = _format_section_dictionary_for_prompt(dictionary_rules)
+        if dict_prompt:
+            system_prompt = system_prompt + dict_prompt
+            log.info("[LangChainAI] Section Dictionary injected: %d rules, %d chars", len(dictionary_rules), len(dict_prompt))
         
         # Few-shot examples si hay feedback disponible
         examples_text = ""
         if feedback_examples:
             examples_text = self._format_feedback_examples(feedback_examples)
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", self._get_epc_user_prompt(examples_text)),
-        ])
+        prompt = _get_epc_prompt_template(system_prompt, self._get_epc_user_prompt(examples_text))
         
-        # Parser de salida JSON
-        parser = JsonOutputParser(pydantic_object=EPCGeneratedContent)
-        
-        # Chain: prompt → LLM → parser
-        chain = prompt | self.llm | parser
+        # Chain: prompt → LLM → parser (el prompt varía con las reglas
+        # inyectadas, así que sólo el parser se reutiliza entre llamadas)
+        chain = prompt | self.llm | _get_epc_parser()
         
         try:
             result = await chain.ainvoke({
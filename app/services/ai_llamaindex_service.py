@@ -13,6 +13,7 @@ from __future__ import annotations
 
 import json
 import logging
+import re
 from typing import Any, Dict, Optional, List
 from datetime import datetime
 
@@ -20,8 +21,21 @@ from pydantic import BaseModel, Field
 
 from app.core.config import settings
 
+# orjson (opcional) decodifica más rápido; su JSONDecodeError hereda de
+# json.JSONDecodeError, así que el manejo de errores no cambia.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover
+    _json_loads = json.loads
+
 log = logging.getLogger(__name__)
 
+# Bloque markdown ```json ... ``` envolviendo TODA la respuesta del LLM (usar con
+# fullmatch sobre el texto ya recortado): el fence solo se quita al inicio y al
+# final, nunca dentro del JSON
+_FENCE_RE = re.compile(r"(?:```json)?(?:```)?([\s\S]*?)(?:```)?")
+
 
 # ============================================================================
 # Output Schemas (sin cambios - compatibilidad con LangChain)
@@ -281,25 +295,18 @@ class LlamaIndexAIService:
     
     def _parse_json_response(self, response_text: str) -> Dict[str, Any]:
         """Parsea respuesta JSON del LLM."""
-        # Limpiar markdown si existe
-        text = response_text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
+        # Limpiar markdown si existe (bloque ```json ... ```, cerrado o no)
+        text = _FENCE_RE.fullmatch(response_text.strip()).group(1).strip()
         
         try:
-            return json.loads(text)
+            return _json_loads(text)
         except json.JSONDecodeError as e:
             log.warning("[LlamaIndexAI] Failed to parse JSON, attempting fix: %s", e)
             # Intentar arreglar JSON común
             try:
                 # Reemplazar comillas simples por dobles
                 fixed = text.replace("'", '"')
-                return json.loads(fixed)
+                return _json_loads(fixed)
             except:
                 log.error("[LlamaIndexAI] Could not parse response as JSON")
                 return {}
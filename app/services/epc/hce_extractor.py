@@ -13,13 +13,30 @@ Soporta:
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from bson import ObjectId, Binary
 from uuid import UUID
 
+from app.adapters.mongo_client import db as mongo
+from .helpers import safe_objectid, uuid_variants
+
 log = logging.getLogger(__name__)
 
+# Saltos de línea HTML en valores de plantillas Ainstein
+_BR_RE = re.compile(r"<br/?>")
+
+# (clave del episodio Ainstein, plantilla de línea) en el orden de salida
+_EPISODIO_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("taltDescripcion", "Tipo de alta: {}"),
+    ("paciEdad", "Edad: {} años"),
+    ("paciSexo", "Sexo: {}"),
+    ("inteFechaIngreso", "Fecha ingreso: {}"),
+    ("inteFechaEgreso", "Fecha egreso: {}"),
+    ("inteDiasEstada", "Días de estadía: {}"),
+)
+
 
 class HCEExtractor:
     """
@@ -30,6 +47,33 @@ class HCEExtractor:
         text = extractor.extract(hce_doc)
     """
     
+    # (campo destino, claves de episodio Ainstein probadas en orden)
+    _EPISODIO_MAPPINGS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+        ("fecha_ingreso", ("inteFechaIngreso",)),
+        ("fecha_egreso", ("inteFechaEgreso",)),
+        ("tipo_alta", ("taltDescripcion",)),
+        ("dias_estada", ("inteDiasEstada",)),
+        ("numero_historia_clinica", ("paciNroHisto", "paciNroDoc")),
+        ("admision_num", ("inteNumero",)),
+        ("sector", ("servDescripcion", "salaDescripcion")),
+        ("habitacion", ("habiNumero",)),
+        ("cama", ("camaDescripcion",)),
+        ("paciente_edad", ("paciEdad",)),
+        ("paciente_sexo", ("paciSexo",)),
+    )
+    
+    # (campo destino, claves de structured probadas en orden)
+    _FALLBACK_MAPPINGS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+        ("fecha_ingreso", ("fecha_ingreso", "fecha_admision", "ingreso_fecha", "Fecha Ingreso")),
+        ("fecha_egreso", ("fecha_egreso", "fecha_alta", "egreso_fecha", "Fecha Egreso")),
+        ("sector", ("sector", "servicio", "unidad", "sector_internacion", "Sector")),
+        ("habitacion", ("habitacion", "hab", "habitacion_num", "nro_habitacion")),
+        ("cama", ("cama", "cama_num", "nro_cama")),
+        ("numero_historia_clinica", ("numero_historia_clinica", "nro_hc", "hc_numero", "historia_clinica")),
+        ("admision_num", ("admision_num", "admission_num", "numero_admision", "nro_admision")),
+        ("protocolo", ("protocolo", "protocolo_num", "numero_protocolo")),
+    )
+    
     def extract(self, hce_doc: Dict[str, Any]) -> str:
         """
         Extrae texto clínico de un documento HCE.
@@ -47,29 +91,24 @@ class HCEExtractor:
     
     def _extract_ainstein(self, hce_doc: Dict[str, Any]) -> str:
         """Extrae texto de HCE importadas desde Ainstein."""
-        parts: List[str] = []
-        
+        return "\n".join(self._iter_ainstein_lines(hce_doc)).strip()
+    
+    def _iter_ainstein_lines(self, hce_doc: Dict[str, Any]) -> Iterator[str]:
+        """Genera las líneas de texto de una HCE Ainstein, en orden."""
         ainstein = hce_doc.get("ainstein") or {}
         episodio = ainstein.get("episodio") or {}
         historia = ainstein.get("historia") or []
         
         # Datos del episodio
         if episodio:
-            ep_parts: List[str] = ["=== DATOS DEL EPISODIO ==="]
-            if episodio.get("taltDescripcion"):
-                ep_parts.append(f"Tipo de alta: {episodio.get('taltDescripcion')}")
-            if episodio.get("paciEdad"):
-                ep_parts.append(f"Edad: {episodio.get('paciEdad')} años")
-            if episodio.get("paciSexo"):
-                ep_parts.append(f"Sexo: {episodio.get('paciSexo')}")
-            if episodio.get("inteFechaIngreso"):
-                ep_parts.append(f"Fecha ingreso: {episodio.get('inteFechaIngreso')}")
-            if episodio.get("inteFechaEgreso"):
-                ep_parts.append(f"Fecha egreso: {episodio.get('inteFechaEgreso')}")
-            if episodio.get("inteDiasEstada"):
-                ep_parts.append(f"Días de estadía: {episodio.get('inteDiasEstada')}")
-            if len(ep_parts) > 1:
-                parts.extend(ep_parts)
+            ep_parts: List[str] = []
+            for key, tpl in _EPISODIO_FIELDS:
+                val = episodio.get(key)
+                if val:
+                    ep_parts.append(tpl.format(val))
+            if ep_parts:
+                yield "=== DATOS DEL EPISODIO ==="
+                yield from ep_parts
         
         # Procesar cada entrada de historia clínica
         for entrada in historia:
@@ -143,8 +182,9 @@ class HCEExtractor:
                         continue
                     val = prop.get("engpValor")
                     if val and isinstance(val, str) and val.strip():
-                        clean_val = val.replace("<br>", " ").replace("<br/>", " ")
-                        clean_val = " ".join(clean_val.split())
+                        if "<br" in val:
+                            val = _BR_RE.sub(" ", val)
+                        clean_val = " ".join(val.split())
                         label = prop.get("grprDescripcion", "Campo")
                         pl_values.append(f"{label}: {clean_val}")
                 if pl_values:
@@ -153,9 +193,7 @@ class HCEExtractor:
                     entry_parts.extend(pl_values)
             
             if len(entry_parts) > 1:
-                parts.extend(entry_parts)
-        
-        return "\n".join(parts).strip()
+                yield from entry_parts
     
     def extract_clinical_data(self, hce_doc: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -176,34 +214,21 @@ class HCEExtractor:
         episodio = ainstein.get("episodio") or {}
         
         if episodio:
-            clinical["fecha_ingreso"] = episodio.get("inteFechaIngreso")
-            clinical["fecha_egreso"] = episodio.get("inteFechaEgreso")
-            clinical["tipo_alta"] = episodio.get("taltDescripcion")
-            clinical["dias_estada"] = episodio.get("inteDiasEstada")
-            clinical["numero_historia_clinica"] = episodio.get("paciNroHisto") or episodio.get("paciNroDoc")
-            clinical["admision_num"] = episodio.get("inteNumero")
-            clinical["sector"] = episodio.get("servDescripcion") or episodio.get("salaDescripcion")
-            clinical["habitacion"] = episodio.get("habiNumero")
-            clinical["cama"] = episodio.get("camaDescripcion")
-            clinical["paciente_edad"] = episodio.get("paciEdad")
-            clinical["paciente_sexo"] = episodio.get("paciSexo")
+            for target_key, source_keys in self._EPISODIO_MAPPINGS:
+                val = None
+                for src in source_keys:
+                    val = episodio.get(src)
+                    if val:
+                        break
+                # Se conservan valores vacíos ("" / 0); sólo se omite None
+                if val is not None:
+                    clinical[target_key] = val
         
         # Prioridad 2: Fallback a structured
         structured = hce_doc.get("structured") or {}
         
         # Solo llenar campos que no se obtuvieron de Ainstein
-        mappings = [
-            ("fecha_ingreso", ["fecha_ingreso", "fecha_admision", "ingreso_fecha", "Fecha Ingreso"]),
-            ("fecha_egreso", ["fecha_egreso", "fecha_alta", "egreso_fecha", "Fecha Egreso"]),
-            ("sector", ["sector", "servicio", "unidad", "sector_internacion", "Sector"]),
-            ("habitacion", ["habitacion", "hab", "habitacion_num", "nro_habitacion"]),
-            ("cama", ["cama", "cama_num", "nro_cama"]),
-            ("numero_historia_clinica", ["numero_historia_clinica", "nro_hc", "hc_numero", "historia_clinica"]),
-            ("admision_num", ["admision_num", "admission_num", "numero_admision", "nro_admision"]),
-            ("protocolo", ["protocolo", "protocolo_num", "numero_protocolo"]),
-        ]
-        
-        for target_key, source_keys in mappings:
+        for target_key, source_keys in self._FALLBACK_MAPPINGS:
             if not clinical.get(target_key):
                 for src in source_keys:
                     val = structured.get(src)
@@ -211,29 +236,28 @@ class HCEExtractor:
                         clinical[target_key] = val
                         break
         
-        # Limpiar valores None
-        return {k: v for k, v in clinical.items() if v is not None}
+        return clinical
     
     def _extract_medications(self, medicacion: List[Dict]) -> List[str]:
         """Extrae texto de medicación."""
         med_texts: List[str] = []
+        med_texts_append = med_texts.append
         for m in medicacion:
             if not isinstance(m, dict):
                 continue
             farmaco = m.get("geneDescripcion", "")
+            if not farmaco:
+                continue
             dosis = m.get("enmeDosis", "")
-            unidad = m.get("tumeDescripcion", "")
-            via = m.get("meviDescripcion", "")
-            frec = m.get("mefrDescripcion", "")
-            if farmaco:
-                med_str = f"{farmaco}"
-                if dosis:
-                    med_str += f" {dosis}{unidad}"
-                if via:
-                    med_str += f" {via}"
-                if frec:
-                    med_str += f" {frec}"
-                med_texts.append(med_str.strip())
+            parts = (
+                farmaco,
+                f"{dosis}{m.get('tumeDescripcion', '')}" if dosis else "",
+                m.get("meviDescripcion", ""),
+                m.get("mefrDescripcion", ""),
+            )
+            med_str = " ".join(str(p) for p in parts if p).strip()
+            if med_str:
+                med_texts_append(med_str)
         return med_texts
     
     def _pick_best_text(self, doc: Dict[str, Any]) -> str:
@@ -286,9 +310,6 @@ def extract_hce_text(hce_doc: Dict[str, Any]) -> str:
 
 async def find_hce_by_id(hce_id: str):
     """Busca HCE por ID en MongoDB."""
-    from app.adapters.mongo_client import db as mongo
-    from .helpers import safe_objectid
-    
     oid = safe_objectid(hce_id)
     if not oid:
         return None
@@ -315,20 +336,18 @@ async def find_latest_hce_for_patient(
     Busca HCE más reciente del paciente.
     Soporta múltiples formatos de ID.
     """
-    from app.adapters.mongo_client import db as mongo
-    from .helpers import uuid_variants
-    
     # Construir query
     or_conditions = []
     
-    # Por patient_id (string y Binary)
-    for variant in uuid_variants(patient_id):
-        or_conditions.append({"patient_id": variant})
+    # Por patient_id (string y Binary) en un único $in
+    pvars = uuid_variants(patient_id)
+    if pvars:
+        or_conditions.append({"patient_id": {"$in": pvars}})
     
     # Por admission_id si existe
     if admission_id:
-        for variant in uuid_variants(admission_id):
-            or_conditions.append({"admission_id": variant})
+        avars = uuid_variants(admission_id)
+        or_conditions.append({"admission_id": {"$in": avars}})
     
     # Por DNI si existe
     if dni:
@@ -11,17 +11,27 @@ import json
 import uuid
 import re
 import logging
-from datetime import datetime, date
-from typing import Any, Dict, Optional, List
+from datetime import datetime, date, timezone
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Dict, Iterator, Optional, List
 from bson import ObjectId, Binary
+from bson.errors import InvalidId
 from uuid import UUID
 
 log = logging.getLogger(__name__)
 
+_UTC = timezone.utc
+_now = datetime.now
+
 
 def now() -> datetime:
-    """Retorna datetime actual UTC."""
-    return datetime.utcnow()
+    """
+    Retorna datetime actual UTC (timezone-aware).
+
+    Reemplaza a datetime.utcnow(), deprecado desde Python 3.12.
+    """
+    return _now(_UTC)
 
 
 def uuid_str() -> str:
@@ -48,19 +58,32 @@ def parse_dt_maybe(val: Any) -> Optional[datetime]:
     if isinstance(val, date):
         return datetime.combine(val, datetime.min.time())
     if isinstance(val, str):
-        val = val.strip()
-        for fmt in (
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%dT%H:%M:%S.%f",
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%d",
-            "%d/%m/%Y %H:%M:%S",
-            "%d/%m/%Y",
-        ):
-            try:
-                return datetime.strptime(val, fmt)
-            except ValueError:
-                pass
+        return _parse_dt_str(val.strip())
+    return None
+
+
+# Formatos probados en orden por parse_dt_maybe
+_DT_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y",
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_dt_str(val: str) -> Optional[datetime]:
+    """
+    Parseo memoizado de strings de fecha (datetime es inmutable, se puede
+    compartir). Los mismos timestamps se repiten en exportaciones por lote.
+    """
+    for fmt in _DT_FORMATS:
+        try:
+            return datetime.strptime(val, fmt)
+        except ValueError:
+            pass
     return None
 
 
@@ -68,8 +91,11 @@ def safe_objectid(value: Any) -> Optional[ObjectId]:
     """Convierte a ObjectId si es válido."""
     if isinstance(value, ObjectId):
         return value
-    if isinstance(value, str) and ObjectId.is_valid(value):
-        return ObjectId(value)
+    if isinstance(value, str):
+        try:
+            return ObjectId(value)
+        except (InvalidId, TypeError):
+            return None
     return None
 
 
@@ -83,7 +109,6 @@ def uuid_variants(val: Optional[str]) -> List[Any]:
         return []
     variants = [val]
     try:
-        from bson import Binary
         u = UUID(val)
         variants.append(Binary(u.bytes, subtype=4))
     except Exception:
@@ -94,7 +119,6 @@ def uuid_variants(val: Optional[str]) -> List[Any]:
 def to_uuid_binary(s: str) -> Optional[Binary]:
     """En Mongo a veces se guarda UUID como Binary subtype=4."""
     try:
-        from bson import Binary
         u = UUID(s)
         return Binary(u.bytes, subtype=4)
     except Exception:
@@ -150,6 +174,9 @@ def json_from_ai(s: Any) -> Dict[str, Any]:
         return {}
 
 
+_ACTOR_FIELDS = ("full_name", "username", "email")
+
+
 def actor_name(user: Any) -> str:
     """
     Obtiene un nombre legible del usuario para el historial.
@@ -171,12 +198,37 @@ def actor_name(user: Any) -> str:
             "usuario"
         )
     
-    return (
-        getattr(user, "full_name", None) or
-        getattr(user, "username", None) or
-        getattr(user, "email", None) or
-        "usuario"
-    )
+    extractor = _actor_fields_getter(type(user))
+    if extractor is not None:
+        full_name, username, email = extractor(user)
+    else:
+        full_name = getattr(user, "full_name", None)
+        username = getattr(user, "username", None)
+        email = getattr(user, "email", None)
+    return full_name or username or email or "usuario"
+
+
+@lru_cache(maxsize=32)
+def _actor_fields_getter(cls: type) -> Optional[attrgetter]:
+    """
+    attrgetter de (full_name, username, email) para clases que declaran
+    los tres atributos (p.ej. el modelo User); None si falta alguno.
+    """
+    if all(hasattr(cls, name) for name in _ACTOR_FIELDS):
+        return attrgetter(*_ACTOR_FIELDS)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_ymd(ymd: str) -> Optional[datetime]:
+    """
+    Parseo memoizado de la fecha de nacimiento. Solo se cachea el parseo:
+    la edad depende del día actual y se calcula en cada llamada.
+    """
+    try:
+        return datetime.strptime(ymd, "%Y-%m-%d")
+    except Exception:
+        return None
 
 
 def age_from_ymd(ymd: Optional[str]) -> Optional[int]:
@@ -184,13 +236,19 @@ def age_from_ymd(ymd: Optional[str]) -> Optional[int]:
     if not ymd:
         return None
     try:
-        born = datetime.strptime(ymd[:10], "%Y-%m-%d")
+        born = _parse_ymd(ymd[:10])
+        if born is None:
+            return None
         today = date.today()
         return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
     except Exception:
         return None
 
 
+# Claves descriptivas probadas en orden por list_to_lines
+_DESC_KEYS = ("descripcion", "detalle", "resumen", "especialidad")
+
+
 def list_to_lines(items: Any) -> str:
     """
     Convierte listas de strings/objetos a texto multilínea para PDF.
@@ -205,10 +263,14 @@ def list_to_lines(items: Any) -> str:
     if not isinstance(items, list):
         return str(items)
     
-    lines = []
+    return "\n".join(_iter_list_lines(items))
+
+
+def _iter_list_lines(items: List[Any]) -> Iterator[str]:
+    """Genera las líneas "• ..." de list_to_lines, una por item."""
     for item in items:
         if isinstance(item, str):
-            lines.append(f"• {item}")
+            yield f"• {item}"
         elif isinstance(item, dict):
             # Medicación
             if "farmaco" in item:
@@ -218,18 +280,17 @@ def list_to_lines(items: Any) -> str:
                     item.get("via", ""),
                     item.get("frecuencia", ""),
                 ]
-                lines.append("• " + " · ".join(p for p in parts if p))
+                yield "• " + " · ".join(p for p in parts if p)
             # Otros objetos
             else:
-                text = (
-                    item.get("descripcion") or
-                    item.get("detalle") or
-                    item.get("resumen") or
-                    item.get("especialidad") or
-                    json.dumps(item, ensure_ascii=False)
-                )
-                lines.append(f"• {text}")
+                text = None
+                for k in _DESC_KEYS:
+                    v = item.get(k)
+                    if v:
+                        text = v
+                        break
+                if text is None:
+                    text = json.dumps(item, ensure_ascii=False)
+                yield f"• {text}"
         else:
-            lines.append(f"• {item}")
-    
-    return "\n".join(lines)
+            yield f"• {item}"
@@ -8,6 +8,7 @@ Responsabilidad única: Construir el payload estructurado para generar PDFs.
 from __future__ import annotations
 
 import logging
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
 from app.core.config import settings
@@ -15,6 +16,49 @@ from .helpers import age_from_ymd, parse_dt_maybe, list_to_lines
 
 log = logging.getLogger(__name__)
 
+# (campo en clinical, etiqueta) para la sección "Datos clínicos"
+_CLINICAL_FIELDS = (
+    ("numero_historia_clinica", "N° Historia Clínica"),
+    ("admision_num", "N° Admisión"),
+    ("protocolo", "Protocolo"),
+)
+_LOC_FIELDS = (
+    ("sector", "Sector"),
+    ("habitacion", "Habitacion"),
+    ("cama", "Cama"),
+)
+
+# (título de sección, clave en generated) en el orden del PDF; la clave None
+# corresponde al "Plan Terapéutico", que se arma desde varias listas
+_LIST_SECTIONS = (
+    ("Procedimientos", "procedimientos"),
+    ("Interconsultas", "interconsultas"),
+    ("Plan Terapéutico", None),
+    ("Indicaciones de alta", "indicaciones_alta"),
+    ("Recomendaciones", "recomendaciones"),
+)
+
+# Tag agrupado de labs en procedimientos: "Laboratorios realizados (N estudios)"
+_LAB_GROUP_MARKER = "Laboratorios realizados"
+_LAB_GROUP_SUFFIX = "estudios)"
+
+# Fallback compartido para generated/data ausentes: build solo lee de él,
+# nunca debe mutarse
+_EMPTY_DICT: Dict[str, Any] = {}
+
+
+@lru_cache(maxsize=1)
+def _clinic_info() -> Dict[str, str]:
+    """Nombre y dirección de la clínica (settings no cambia en runtime)."""
+    return {
+        "name": (
+            getattr(settings, "CLINIC_NAME", None) or
+            getattr(settings, "APP_NAME", None) or
+            "Clínica / Consultorio"
+        ),
+        "address": getattr(settings, "CLINIC_ADDRESS", None) or "",
+    }
+
 
 class EPCPDFBuilder:
     """
@@ -42,16 +86,15 @@ class EPCPDFBuilder:
             hce: HCE para expandir labs (opcional)
         """
         clinical = clinical or {}
-        generated = epc_doc.get("generated") or {}
+        generated = epc_doc.get("generated") or _EMPTY_DICT
         gdata = generated.get("data") if isinstance(generated, dict) else None
-        if not isinstance(gdata, dict):
-            gdata = {}
+        gdata = gdata if isinstance(gdata, dict) else _EMPTY_DICT
         
         # Datos del paciente
         patient_info = self._extract_patient_info(patient, epc_doc)
         
         # Datos del médico
-        medico_name = (epc_doc.get("medico_responsable") or "").strip()
+        doctor = {"full_name": (epc_doc.get("medico_responsable") or "").strip(), "matricula": ""}
         
         # Fecha de emisión
         fecha_emision = self._get_fecha_emision(epc_doc)
@@ -63,25 +106,21 @@ class EPCPDFBuilder:
         sections = self._build_sections(gdata, generated, clinical, hce, epc_doc, titulo)
         
         # Info de clínica
-        clinic_name = (
-            getattr(settings, "CLINIC_NAME", None) or
-            getattr(settings, "APP_NAME", None) or
-            "Clínica / Consultorio"
-        )
-        clinic_address = getattr(settings, "CLINIC_ADDRESS", None) or ""
+        clinic = _clinic_info()
         
         return {
             "id": epc_doc.get("_id"),
             "created_at": epc_doc.get("created_at"),
             "updated_at": epc_doc.get("updated_at"),
             "fecha_emision": fecha_emision,
-            "clinic": {"name": clinic_name, "address": clinic_address},
+            "clinic": {"name": clinic["name"], "address": clinic["address"]},
             "patient": patient_info,
-            "doctor": {"full_name": medico_name or "", "matricula": ""},
+            "doctor": doctor,
             "sections": sections,
         }
     
-    def _extract_patient_info(self, patient: Any, epc_doc: Dict) -> Dict[str, Any]:
+    @staticmethod
+    def _extract_patient_info(patient: Any, epc_doc: Dict) -> Dict[str, Any]:
         """Extrae información del paciente."""
         if not patient:
             return {
@@ -98,12 +137,12 @@ class EPCPDFBuilder:
         fn = getattr(patient, "fecha_nacimiento", None)
         edad = age_from_ymd(fn) if fn else None
         
-        patient_full_name = ", ".join([
-            p for p in [
-                str(apellido).strip() if apellido else "",
-                str(nombre).strip() if nombre else "",
-            ] if p
-        ]).strip()
+        ap = (apellido if isinstance(apellido, str) else str(apellido)).strip() if apellido else ""
+        no = (nombre if isinstance(nombre, str) else str(nombre)).strip() if nombre else ""
+        if ap and no:
+            patient_full_name = f"{ap}, {no}"
+        else:
+            patient_full_name = ap or no
         
         return {
             "full_name": patient_full_name or (epc_doc.get("patient_id") or ""),
@@ -112,7 +151,8 @@ class EPCPDFBuilder:
             "sex": sexo or "",
         }
     
-    def _get_fecha_emision(self, epc_doc: Dict) -> Any:
+    @staticmethod
+    def _get_fecha_emision(epc_doc: Dict) -> Any:
         """Obtiene fecha de emisión."""
         fecha_emision = (
             epc_doc.get("fecha_emision") or
@@ -150,67 +190,47 @@ class EPCPDFBuilder:
         if evolucion:
             sections["Evolución"] = str(evolucion)
         
-        # Procedimientos
-        procedimientos = gdata.get("procedimientos") or generated.get("procedimientos") or []
-        if procedimientos:
-            procedimientos = self._process_procedimientos(procedimientos, hce, epc_doc)
-            sections["Procedimientos"] = list_to_lines(procedimientos)
-        
-        # Interconsultas
-        interconsultas = gdata.get("interconsultas") or generated.get("interconsultas") or []
-        if interconsultas:
-            sections["Interconsultas"] = list_to_lines(interconsultas)
-        
-        # Medicación
-        med_text = self._build_medication_section(gdata, generated)
-        if med_text:
-            sections["Plan Terapéutico"] = med_text
-        
-        # Indicaciones y recomendaciones
-        indicaciones_alta = gdata.get("indicaciones_alta") or generated.get("indicaciones_alta") or []
-        recomendaciones = gdata.get("recomendaciones") or generated.get("recomendaciones") or []
-        
-        if indicaciones_alta:
-            sections["Indicaciones de alta"] = list_to_lines(indicaciones_alta)
-        if recomendaciones:
-            sections["Recomendaciones"] = list_to_lines(recomendaciones)
+        # Procedimientos, interconsultas, medicación, indicaciones y recomendaciones
+        for title, key in _LIST_SECTIONS:
+            if key is None:
+                val = self._build_medication_section(gdata, generated)
+            else:
+                val = gdata.get(key) or generated.get(key)
+                if not val:
+                    continue
+                if key == "procedimientos":
+                    val = self._process_procedimientos(val, hce, epc_doc)
+                val = list_to_lines(val)
+            if val:
+                sections[title] = val
         
         return sections
     
-    def _build_clinical_section(self, clinical: Dict) -> str:
+    @staticmethod
+    def _build_clinical_section(clinical: Dict) -> str:
         """Construye sección de datos clínicos."""
         if not clinical:
             return ""
         
-        lines: List[str] = []
-        
-        field_mapping = [
-            ("numero_historia_clinica", "N° Historia Clínica"),
-            ("admision_num", "N° Admisión"),
-            ("protocolo", "Protocolo"),
-        ]
-        
-        for field, label in field_mapping:
-            if clinical.get(field):
-                lines.append(f"{label}: {clinical.get(field)}")
+        g = clinical.get
+        lines: List[str] = [f"{label}: {g(field)}" for field, label in _CLINICAL_FIELDS if g(field)]
         
         # Fechas
-        fecha_ingreso = clinical.get("fecha_ingreso_display") or clinical.get("fecha_ingreso")
+        fecha_ingreso = g("fecha_ingreso_display") or g("fecha_ingreso")
         if fecha_ingreso:
             lines.append(f"Fecha ingreso: {fecha_ingreso}")
         
-        fecha_egreso = clinical.get("fecha_egreso_display") or clinical.get("fecha_egreso")
+        fecha_egreso = g("fecha_egreso_display") or g("fecha_egreso")
         if fecha_egreso:
             lines.append(f"Fecha egreso: {fecha_egreso}")
         
         # Ubicación
-        for field in ["sector", "habitacion", "cama"]:
-            if clinical.get(field):
-                lines.append(f"{field.capitalize()}: {clinical.get(field)}")
+        lines.extend(f"{label}: {g(field)}" for field, label in _LOC_FIELDS if g(field))
         
         return "\n".join(lines)
     
-    def _build_medication_section(self, gdata: Dict, generated: Dict) -> str:
+    @staticmethod
+    def _build_medication_section(gdata: Dict, generated: Dict) -> str:
         """Construye sección de medicación."""
         medicacion_internacion = gdata.get("medicacion_internacion") or generated.get("medicacion_internacion") or []
         medicacion_previa = gdata.get("medicacion_previa") or generated.get("medicacion_previa") or []
@@ -221,28 +241,23 @@ class EPCPDFBuilder:
             
             if medicacion_internacion:
                 med_lines.append("Medicación durante internación:")
-                for med in medicacion_internacion:
-                    parts = [
-                        med.get("farmaco", ""),
-                        med.get("dosis", ""),
-                        med.get("via", ""),
-                        med.get("frecuencia", "")
-                    ]
-                    med_str = " ".join([p for p in parts if p]).strip()
-                    med_lines.append(f"• {med_str}")
+                med_lines.extend(
+                    "• " + " ".join(p for p in (
+                        m.get("farmaco", ""), m.get("dosis", ""), m.get("via", ""), m.get("frecuencia", ""),
+                    ) if p).strip()
+                    for m in medicacion_internacion
+                )
             
             if medicacion_previa:
                 if med_lines:
                     med_lines.append("")
                 med_lines.append("Medicación habitual previa:")
-                for med in medicacion_previa:
-                    parts = [
-                        med.get("farmaco", ""),
-                        med.get("dosis", ""),
-                        med.get("via", "")
-                    ]
-                    med_str = " ".join([p for p in parts if p]).strip()
-                    med_lines.append(f"• {med_str}")
+                med_lines.extend(
+                    "• " + " ".join(p for p in (
+                        m.get("farmaco", ""), m.get("dosis", ""), m.get("via", ""),
+                    ) if p).strip()
+                    for m in medicacion_previa
+                )
             
             return "\n".join(med_lines)
         
@@ -268,38 +283,55 @@ class EPCPDFBuilder:
             return procedimientos
         
         procedimientos_expandidos = []
+        # Líneas expandidas de labs seleccionados; se calculan recién en el
+        # primer tag agrupado (None = todavía no calculadas)
+        lab_lines: Optional[List[str]] = None
         
+        append = procedimientos_expandidos.append
         for proc_item in procedimientos:
-            proc_str = str(proc_item) if not isinstance(proc_item, str) else proc_item
+            proc_str = proc_item if isinstance(proc_item, str) else str(proc_item)
             
-            # Detectar tag agrupado de labs
-            if "Laboratorios realizados" in proc_str and "estudios)" in proc_str:
-                parsed_hce = hce.get("ai_generated", {}) or {}
-                parsed_data = parsed_hce.get("parsed_hce", {})
-                procedimientos_hce = parsed_data.get("procedimientos", [])
-                
-                if procedimientos_hce:
-                    labs_individuales = [
-                        p for p in procedimientos_hce
-                        if isinstance(p, dict)
-                        and p.get("categoria") == "laboratorio"
-                        and p.get("descripcion") in selected_labs
-                    ]
-                    
-                    if labs_individuales:
-                        procedimientos_expandidos.append("Laboratorios seleccionados:")
-                        for lab in labs_individuales:
-                            fecha = lab.get("fecha", "")[:16] if lab.get("fecha") else ""
-                            desc = lab.get("descripcion", "Lab")
-                            if fecha:
-                                procedimientos_expandidos.append(f"  {fecha}: {desc}")
-                            else:
-                                procedimientos_expandidos.append(f"  {desc}")
-                        continue
+            # Caso común: no es el tag agrupado de labs
+            if _LAB_GROUP_MARKER not in proc_str or _LAB_GROUP_SUFFIX not in proc_str:
+                append(proc_item)
+                continue
             
-            procedimientos_expandidos.append(proc_item)
+            if lab_lines is None:
+                lab_lines = self._selected_lab_lines(hce, selected_labs)
+            if lab_lines:
+                procedimientos_expandidos.extend(lab_lines)
+            else:
+                append(proc_item)
         
         return procedimientos_expandidos
+    
+    @staticmethod
+    def _selected_lab_lines(hce: Dict, selected_labs: List) -> List[str]:
+        """Líneas de los laboratorios individuales de la HCE elegidos para exportar."""
+        parsed_hce = hce.get("ai_generated", {}) or {}
+        procedimientos_hce = parsed_hce.get("parsed_hce", {}).get("procedimientos", [])
+        if not procedimientos_hce:
+            return []
+        
+        selected_set = frozenset(selected_labs)
+        lines: List[str] = []
+        for p in procedimientos_hce:
+            if (
+                isinstance(p, dict)
+                and p.get("categoria") == "laboratorio"
+                and p.get("descripcion") in selected_set
+            ):
+                fecha = p.get("fecha", "")[:16] if p.get("fecha") else ""
+                desc = p.get("descripcion", "Lab")
+                lines.append(f"  {fecha}: {desc}" if fecha else f"  {desc}")
+        
+        if lines:
+            lines.insert(0, "Laboratorios seleccionados:")
+        return lines
+
+
+# EPCPDFBuilder no tiene estado: una instancia compartida alcanza
+_BUILDER = EPCPDFBuilder()
 
 
 # Función de conveniencia
@@ -310,5 +342,4 @@ def build_epc_pdf_payload(
     hce: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """Construye payload para PDF de EPC."""
-    builder = EPCPDFBuilder()
-    return builder.build(epc_doc, patient, clinical, hce)
+    return _BUILDER.build(epc_doc, patient, clinical, hce)
@@ -9,21 +9,53 @@ Principio: "La IA solo debería generar texto, no inferir hechos."
 """
 
 import logging
-from typing import Dict, List, Any, Optional
+import re
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
+from types import MappingProxyType
 
 from app.services.hce_ainstein_parser import ParsedHCE
 from app.rules.death_detection import detect_death_in_text
 
 log = logging.getLogger(__name__)
 
+# Frases de alta que contradicen un óbito (en orden de reporte)
+_FRASES_ALTA_CONTRADICTORIAS = (
+    "alta a domicilio", "se retira deambulando",
+    "paciente dado de alta", "evolución favorable",
+    "mejoría sintomática. alta",
+)
+# Una sola pasada por evolución para saber si hay alguna frase; solo en ese
+# caso (raro) se busca cuál reportar respetando el orden de la tupla
+_RE_FRASES_ALTA = re.compile("|".join(map(re.escape, _FRASES_ALTA_CONTRADICTORIAS)))
 
-@dataclass
+# Templates de warnings sobre texto de evoluciones
+_WARN_CONTRADICCION = "Contradicción: HCE menciona '{}' pero tipo_alta es OBITO"
+_WARN_SEXO = "Contradicción de sexo: Episodio dice {} pero evolución menciona 'paciente {}'"
+
+# Overrides fijos para óbito; get_context_overrides copia y agrega el tipo_alta
+_OBITO_OVERRIDES_BASE = MappingProxyType({
+    "PACIENTE_FALLECIDO": True,
+    "NO_INDICACIONES_ALTA": True,
+    "NO_RECOMENDACIONES": True,
+    "INSTRUCCION_OBITO": (
+        "⚠️ IMPORTANTE: El paciente FALLECIÓ (tipo_alta = OBITO). "
+        "El último párrafo DEBE comenzar con 'PACIENTE OBITÓ - Fecha: ... Hora: ...'. "
+        "NO mencionar alta a domicilio, mejoría, ni recomendaciones post-alta."
+    ),
+})
+
+# Códigos de sexo aceptados en el episodio
+_SEXOS_VALIDOS = frozenset({"M", "F", "MASCULINO", "FEMENINO"})
+_SEXOS_MASCULINO = frozenset({"M", "MASCULINO"})
+
+
+@dataclass(slots=True)
 class ValidationResult:
     """Resultado de validación pre-generación."""
     is_valid: bool
-    warnings: List[str]
-    errors: List[str]
+    warnings: Tuple[str, ...]
+    errors: Tuple[str, ...]
     corrections: Dict[str, Any]
     # Flags importantes
     is_obito: bool = False
@@ -42,6 +74,7 @@ class EPCPreValidator:
         "OBITO", "ÓBITO", "FALLECIDO", "FALLECIMIENTO",
         "DEFUNCION", "DEFUNCIÓN", "MUERTE"
     ]
+    _RE_OBITO = re.compile("|".join(map(re.escape, TIPOS_ALTA_OBITO)))
     
     def validate(self, parsed_hce: ParsedHCE) -> ValidationResult:
         """
@@ -57,12 +90,16 @@ class EPCPreValidator:
         errors: List[str] = []
         corrections: Dict[str, Any] = {}
         
+        evols = parsed_hce.sections.evoluciones_medicas
+        # Contenido en minúsculas, calculado una sola vez por evolución
+        contenidos_lower = [(e.get("contenido", "") or "").lower() for e in evols]
+        
         # 1. Detectar ÓBITO desde tipo_alta del episodio (FUENTE DE VERDAD)
         tipo_alta = (parsed_hce.tipo_alta or "").upper().strip()
-        is_obito = any(t in tipo_alta for t in self.TIPOS_ALTA_OBITO)
+        is_obito = bool(self._RE_OBITO.search(tipo_alta))
         
         if is_obito:
-            log.info(f"[PreValidator] ÓBITO detectado desde tipo_alta: {tipo_alta}")
+            log.info("[PreValidator] ÓBITO detectado desde tipo_alta: %s", tipo_alta)
             corrections["force_obito"] = True
             corrections["tipo_alta"] = tipo_alta
         
@@ -71,7 +108,7 @@ class EPCPreValidator:
         # El tipo_alta del sistema Markey es la FUENTE DE VERDAD para fallecimiento.
         # Solo agregamos un warning informativo.
         if not is_obito:
-            for evol in parsed_hce.sections.evoluciones_medicas:
+            for evol in evols:
                 contenido = evol.get("contenido", "")
                 death_result = detect_death_in_text(contenido)
                 if death_result.detected:
@@ -83,11 +120,33 @@ class EPCPreValidator:
                     )
                     corrections["obito_mencionado_en_texto"] = True
                     log.warning(
-                        f"[PreValidator] Texto menciona muerte pero tipo_alta='{tipo_alta}'. "
-                        f"NO se fuerza OBITO. El tipo_alta es la fuente de verdad."
+                        "[PreValidator] Texto menciona muerte pero tipo_alta='%s'. "
+                        "NO se fuerza OBITO. El tipo_alta es la fuente de verdad.",
+                        tipo_alta,
                     )
                     break
         
+        # Una sola pasada por evolución para las dos detecciones sobre texto:
+        # contradicciones de alta (solo si es óbito) y sexo opuesto. Los
+        # warnings se acumulan por categoría y se reportan en su lugar (4 y 6).
+        # has_contradictions es un flag: alcanza con la primera contradicción,
+        # después solo se sigue buscando el sexo opuesto.
+        sexo_normalizado = "masculino" if parsed_hce.sexo in _SEXOS_MASCULINO else "femenino"
+        sexo_opuesto = "femenino" if sexo_normalizado == "masculino" else "masculino"
+        marcador_opuesto = f"paciente {sexo_opuesto}"
+        warn_sexo = _WARN_SEXO.format(sexo_normalizado, sexo_opuesto)
+        
+        warnings_contradiccion: List[str] = []
+        warnings_sexo: List[str] = []
+        buscar_contradiccion = is_obito
+        for contenido in contenidos_lower:
+            if buscar_contradiccion and _RE_FRASES_ALTA.search(contenido):
+                frase = next(f for f in _FRASES_ALTA_CONTRADICTORIAS if f in contenido)
+                warnings_contradiccion.append(_WARN_CONTRADICCION.format(frase))
+                buscar_contradiccion = False
+            if marcador_opuesto in contenido:
+                warnings_sexo.append(warn_sexo)
+        
         # 3. Validar consistencia de datos
         if parsed_hce.dias_estada == 0 and parsed_hce.fecha_egreso:
             warnings.append("Días de estadía es 0 pero hay fecha de egreso")
@@ -95,63 +154,42 @@ class EPCPreValidator:
         if not parsed_hce.sections.ingreso:
             warnings.append("No hay texto de ingreso registrado")
         
-        if len(parsed_hce.sections.evoluciones_medicas) == 0:
+        if not evols:
             warnings.append("No hay evoluciones médicas registradas")
         
-        # 4. Detectar contradicciones en texto fuente
-        if is_obito:
-            frases_alta_contradictorias = [
-                "alta a domicilio", "se retira deambulando",
-                "paciente dado de alta", "evolución favorable",
-                "mejoría sintomática. alta"
-            ]
-            
-            for evol in parsed_hce.sections.evoluciones_medicas:
-                contenido = (evol.get("contenido", "") or "").lower()
-                for frase in frases_alta_contradictorias:
-                    if frase in contenido:
-                        warnings.append(
-                            f"Contradicción: HCE menciona '{frase}' pero tipo_alta es OBITO"
-                        )
-                        corrections["has_contradictions"] = True
-                        break
+        # 4. Contradicciones en texto fuente
+        if warnings_contradiccion:
+            warnings.extend(warnings_contradiccion)
+            corrections["has_contradictions"] = True
         
         # 5. Validar datos demográficos
         if parsed_hce.edad <= 0 or parsed_hce.edad > 120:
             warnings.append(f"Edad inválida: {parsed_hce.edad}")
         
-        if parsed_hce.sexo not in ["M", "F", "MASCULINO", "FEMENINO"]:
+        if parsed_hce.sexo not in _SEXOS_VALIDOS:
             warnings.append(f"Sexo no reconocido: {parsed_hce.sexo}")
         
-        # 6. Detectar sexo incorrecto en texto
-        sexo_normalizado = "masculino" if parsed_hce.sexo in ["M", "MASCULINO"] else "femenino"
-        sexo_opuesto = "femenino" if sexo_normalizado == "masculino" else "masculino"
-        
-        for evol in parsed_hce.sections.evoluciones_medicas:
-            contenido = (evol.get("contenido", "") or "").lower()
-            if f"paciente {sexo_opuesto}" in contenido:
-                warnings.append(
-                    f"Contradicción de sexo: Episodio dice {sexo_normalizado} pero "
-                    f"evolución menciona 'paciente {sexo_opuesto}'"
-                )
-                corrections["sexo_incorrecto_en_texto"] = True
+        # 6. Sexo incorrecto en texto
+        if warnings_sexo:
+            warnings.extend(warnings_sexo)
+            corrections["sexo_incorrecto_en_texto"] = True
         
         # Determinar si es válido
         is_valid = len(errors) == 0
         
         result = ValidationResult(
             is_valid=is_valid,
-            warnings=warnings,
-            errors=errors,
+            warnings=tuple(warnings),
+            errors=tuple(errors),
             corrections=corrections,
             is_obito=is_obito,
             tipo_alta_oficial=tipo_alta or None
         )
         
         log.info(
-            f"[PreValidator] Validación completa: "
-            f"valid={is_valid}, obito={is_obito}, "
-            f"warnings={len(warnings)}, errors={len(errors)}"
+            "[PreValidator] Validación completa: "
+            "valid=%s, obito=%s, warnings=%d, errors=%d",
+            is_valid, is_obito, len(warnings), len(errors),
         )
         
         return result
@@ -166,18 +204,11 @@ class EPCPreValidator:
         Returns:
             Dict con valores que DEBEN usarse en lugar de los inferidos
         """
-        overrides = {}
-        
         if validation.is_obito:
-            overrides["PACIENTE_FALLECIDO"] = True
+            overrides = dict(_OBITO_OVERRIDES_BASE)
             overrides["TIPO_ALTA_OFICIAL"] = validation.tipo_alta_oficial
-            overrides["NO_INDICACIONES_ALTA"] = True
-            overrides["NO_RECOMENDACIONES"] = True
-            overrides["INSTRUCCION_OBITO"] = (
-                "⚠️ IMPORTANTE: El paciente FALLECIÓ (tipo_alta = OBITO). "
-                "El último párrafo DEBE comenzar con 'PACIENTE OBITÓ - Fecha: ... Hora: ...'. "
-                "NO mencionar alta a domicilio, mejoría, ni recomendaciones post-alta."
-            )
+        else:
+            overrides = {}
         
         if validation.corrections.get("sexo_incorrecto_en_texto"):
             overrides["IGNORAR_SEXO_EN_TEXTO"] = True
@@ -185,7 +216,19 @@ class EPCPreValidator:
         return overrides
 
 
+# Singleton: el validador no guarda estado entre llamadas (patrones
+# compilados a nivel de módulo/clase), así que una instancia alcanza
+_validator_instance: Optional[EPCPreValidator] = None
+
+
+def get_epc_pre_validator() -> EPCPreValidator:
+    """Obtiene instancia singleton del validador."""
+    global _validator_instance
+    if _validator_instance is None:
+        _validator_instance = EPCPreValidator()
+    return _validator_instance
+
+
 def validate_hce_for_epc(parsed_hce: ParsedHCE) -> ValidationResult:
     """Función de conveniencia para validar HCE."""
-    validator = EPCPreValidator()
-    return validator.validate(parsed_hce)
+    return get_epc_pre_validator().validate(parsed_hce)
@@ -7,13 +7,130 @@ Este módulo implementa una arquitectura de generación de EPC que:
 3. Combina los resultados respetando ordenamientos (cronológico, alfabético)
 """
 import re
+import json
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.ai_gemini_service import GeminiAIService
+from app.services.ai_langchain_service import _post_process_epc_result, _load_section_dictionary
+from app.services.hce_json_parser import _medical_title_case
+
+# Parser JSON para la respuesta cruda de Gemini: orjson si está instalado,
+# si no el json de la librería estándar.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover
+    _json_loads = json.loads
 
 log = logging.getLogger(__name__)
 
 
+# =============================================================================
+# PATRONES COMPILADOS (una vez por proceso)
+# =============================================================================
+
+# Encabezados de sección de la HCE (encabezado -> clave). Un único regex
+# con alternancia encuentra todos los encabezados en una sola pasada; el
+# separador final va en un lookahead para que un encabezado inmediatamente
+# seguido de otro (sección vacía) comparta el separador como en el texto.
+_HEADER_TO_KEY = {
+    "INGRESO DE PACIENTE": "ingreso",
+    "EVOLUCIÓN MÉDICA": "evolucion",
+    "DIAGNÓSTICOS": "diagnosticos",
+    "INDICACIONES": "indicaciones",
+    "PROCEDIMIENTOS / ESTUDIOS": "procedimientos",
+    "HOJA DE ENFERMERÍA": "enfermeria",
+    "PLANTILLAS": "plantillas",
+}
+_PAT_SECTIONS = re.compile(
+    r"={10,}\n(?P<name>" + "|".join(map(re.escape, _HEADER_TO_KEY)) + r")\n(?=(?P<rule>={10,}))"
+)
+_SECTION_RULE = "=" * 10 + "\n"
+
+# Medicación
+_PAT_IND_BLOCK = re.compile(r"-\s*\[(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})\]\s*INDICACION\s*#\d+\s*•\s*([^\n]+)")
+_PAT_FARMACO_NAME = re.compile(r"([^(]+)")
+# Dosis/Vía/Frecuencia en una sola pasada. El lookahead no consume texto, así
+# que un campo vacío que "absorbe" la línea siguiente ("Dosis:\nVía: Oral")
+# no oculta al campo de esa línea, igual que con tres búsquedas separadas.
+_PAT_DVF = re.compile(r"(?=(Dosis|Vía|Frecuencia):\s*(.+))")
+_PAT_SIMPLE_MED_LINE = re.compile(r"Medicación:\s*([^\n]+)")
+_PAT_MED_PARTS = re.compile(
+    r"([A-Za-záéíóúñÁÉÍÓÚÑ]+)\s*"  # fármaco
+    r"([\d.,]+\s*(?:mg|g|ml|mcg|UI|unidades)?)\s*"  # dosis
+    r"(Oral|Intravenoso|IV|IM|SC|Subcutaneo|EV|Tópico|Inhalatoria)?\s*"  # vía
+    r"(.+)?",  # frecuencia
+    re.IGNORECASE,
+)
+_PAT_PREV_MEDS = tuple(
+    re.compile(p, re.IGNORECASE) for p in (
+        r"MH:\s*([^.]+\.)",
+        r"Medicación habitual:\s*([^.]+\.)",
+        r"medicación habitual:\s*([^.]+\.)",
+        r"Tratamiento previo:\s*([^.]+\.)",
+    )
+)
+_PREV_MEDS_TOKENS = ("mh:", "medicación habitual:", "tratamiento previo:")
+_PAT_MED_SPLIT = re.compile(r"[,;]")
+_PAT_PREV_MED_PARTS = re.compile(r"([a-záéíóúñ]+)\s*([\d,./]+\s*m?g)?(?:\s*(.+))?", re.IGNORECASE)
+
+# Procedimientos
+# Ambos formatos en una sola pasada. El formato simple va en un lookahead
+# para no consumir texto: un "Procedimientos:" cuyo \s* cruza de línea no se
+# come la entrada con fecha siguiente. _PAT_PROC_SIMPLE_AT busca además los
+# "Procedimientos:" que quedan dentro de una entrada con fecha.
+_PAT_PROCS = re.compile(
+    r"-\s*\[(?P<fh>\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})\]\s*(?P<tipo>[^\n]+)\n\s*(?P<desc>[^\n]+)"
+    r"|(?=Procedimientos?:\s*(?P<desc_simple>[^\n]+))"
+)
+_PAT_PROC_SIMPLE_AT = re.compile(r"(?=Procedimientos?:\s*(?P<desc_simple>[^\n]+))")
+
+# Interconsultas
+_PAT_IC1 = re.compile(r"-\s*\[(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})\]\s*EVOLUCION DE INTERCONSULTA")
+_PAT_IC2 = re.compile(r"INTERCONSULTA\s+([A-Z\s]+?)(?:\n|Obs:|$)")
+_PAT_IC3 = re.compile(r"Interconsultas?:\s*([^\n]+)")
+
+# Mapeo de términos a especialidades. El orden del dict es la prioridad: si el
+# contexto menciona varias, gana la que aparece primero aquí (no la primera en
+# el texto). Todas las claves se buscan en una sola pasada con un lookahead,
+# que reporta también coincidencias solapadas ("UCI" dentro de otra palabra).
+_SPECIALTY_MAP = {
+    "CLINICA MEDICA": "Clínica Médica",
+    "TRAUMATOLOGIA": "Traumatología",
+    "KINESIOLOGIA": "Kinesiología",
+    "CARDIOLOGIA": "Cardiología",
+    "UROLOGIA": "Urología",
+    "NEUROLOGIA": "Neurología",
+    "CIRUGIA": "Cirugía General",
+    "GASTROENTEROLOGIA": "Gastroenterología",
+    "NEUMONOLOGIA": "Neumonología",
+    "INFECTOLOGIA": "Infectología",
+    "UCI": "Terapia Intensiva",
+    "UTI": "Terapia Intensiva",
+}
+# Fallback por contenido cuando no aparece ninguna clave (en orden de prioridad)
+_SPECIALTY_FALLBACK_KEYWORDS = (
+    ("traumatol", "Traumatología"),
+    ("cadera", "Traumatología"),
+    ("clinic", "Clínica Médica"),
+    ("kinesio", "Kinesiología"),
+)
+_SPECIALTY_PRIORITY = {key.lower(): i for i, key in enumerate(_SPECIALTY_MAP)}
+_SPECIALTY_BY_LOWER = {key.lower(): val for key, val in _SPECIALTY_MAP.items()}
+_PAT_SPECIALTY = re.compile(
+    "(?=(" + "|".join(map(re.escape, _SPECIALTY_PRIORITY)) + "))"
+)
+
+# Diagnóstico y limpieza de respuesta IA
+_PAT_DIAG = re.compile(r"•\s*([A-Z][^\n]+\([A-Z0-9.]+\))")
+_PAT_MD_FENCE = re.compile(r"```(?:json)?\s*")
+
+
 # =============================================================================
 # PARSING DE HCE POR SECCIONES
 # =============================================================================
@@ -37,26 +154,19 @@ def parse_hce_sections(hce_text: str) -> Dict[str, str]:
         "full_text": hce_text,
     }
     
-    # Patrones para detectar inicio de secciones
-    section_patterns = [
-        (r"={10,}\nINGRESO DE PACIENTE\n={10,}", "ingreso"),
-        (r"={10,}\nEVOLUCIÓN MÉDICA\n={10,}", "evolucion"),
-        (r"={10,}\nDIAGNÓSTICOS\n={10,}", "diagnosticos"),
-        (r"={10,}\nINDICACIONES\n={10,}", "indicaciones"),
-        (r"={10,}\nPROCEDIMIENTOS / ESTUDIOS\n={10,}", "procedimientos"),
-        (r"={10,}\nHOJA DE ENFERMERÍA\n={10,}", "enfermeria"),
-        (r"={10,}\nPLANTILLAS\n={10,}", "plantillas"),
-    ]
+    # Sin separadores "==========" no hay encabezados de sección
+    if _SECTION_RULE not in hce_text:
+        return sections
     
-    # Encontrar posiciones de cada sección
+    # Encontrar posiciones de cada sección (primera aparición de cada
+    # encabezado; finditer ya las devuelve ordenadas por posición)
     positions = []
-    for pattern, name in section_patterns:
-        match = re.search(pattern, hce_text)
-        if match:
-            positions.append((match.start(), match.end(), name))
-    
-    # Ordenar por posición
-    positions.sort(key=lambda x: x[0])
+    found = set()
+    for match in _PAT_SECTIONS.finditer(hce_text):
+        name = _HEADER_TO_KEY[match.group("name")]
+        if name not in found:
+            found.add(name)
+            positions.append((match.start(), match.end() + len(match.group("rule")), name))
     
     # Extraer contenido de cada sección
     for i, (start, end, name) in enumerate(positions):
@@ -76,42 +186,40 @@ def extract_medications_from_indicaciones(indicaciones_text: str) -> List[Dict[s
     Soporta múltiples formatos.
     """
     medications = []
+    if "INDICACION" not in indicaciones_text:
+        return medications
     
     # Formato 1: Bloques estructurados con INDICACION #
     # Ejemplo: - [2025-12-16 11:51:54] INDICACION #4193729 • OMEPRAZOL (4/6)
-    pattern1 = r"-\s*\[(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})\]\s*INDICACION\s*#\d+\s*•\s*([^\n]+)"
-    
-    for match in re.finditer(pattern1, indicaciones_text):
+    # Los bloques van de un encabezado INDICACION al siguiente: se materializan
+    # los matches una vez y se usan de a pares (sin re-escanear la cola)
+    matches = list(_PAT_IND_BLOCK.finditer(indicaciones_text))
+    text_len = len(indicaciones_text)
+    for i, match in enumerate(matches):
         fecha = match.group(1)
         medicacion_line = match.group(2).strip()
         
         # Extraer nombre del fármaco
-        farmaco_match = re.match(r"([^(]+)", medicacion_line)
+        farmaco_match = _PAT_FARMACO_NAME.match(medicacion_line)
         farmaco = farmaco_match.group(1).strip() if farmaco_match else medicacion_line
         
-        # Buscar bloque siguiente para dosis/vía/frecuencia
+        # Bloque hasta la siguiente indicación para dosis/vía/frecuencia
         block_start = match.end()
-        next_match = re.search(pattern1, indicaciones_text[block_start:])
-        block_end = block_start + next_match.start() if next_match else len(indicaciones_text)
+        block_end = matches[i + 1].start() if i + 1 < len(matches) else text_len
         block = indicaciones_text[block_start:block_end]
         
-        dosis = ""
-        via = ""
-        frecuencia = ""
-        
-        dosis_match = re.search(r"Dosis:\s*(.+)", block)
-        if dosis_match:
-            dosis = dosis_match.group(1).strip()
-        
-        via_match = re.search(r"Vía:\s*(.+)", block)
-        if via_match:
-            via = via_match.group(1).strip()
-            if via == "-":
-                via = ""
+        # Primera aparición de cada campo
+        fields = {}
+        for field_match in _PAT_DVF.finditer(block):
+            fields.setdefault(field_match.group(1), field_match.group(2))
+            if len(fields) == 3:
+                break
         
-        freq_match = re.search(r"Frecuencia:\s*(.+)", block)
-        if freq_match:
-            frecuencia = freq_match.group(1).strip()
+        dosis = fields.get("Dosis", "").strip()
+        via = fields.get("Vía", "").strip()
+        if via == "-":
+            via = ""
+        frecuencia = fields.get("Frecuencia", "").strip()
         
         if farmaco:
             medications.append({
@@ -131,24 +239,18 @@ def extract_medications_simple_format(hce_text: str) -> List[Dict[str, Any]]:
     Medicación: cefTRIAXona 1000mg Intravenoso 1 vez al día
     """
     medications = []
+    if "Medicación:" not in hce_text:
+        return medications
     
     # Patrón: Medicación: FARMACO DOSIS VIA FRECUENCIA
-    pattern = r"Medicación:\s*([^\n]+)"
-    
-    for match in re.finditer(pattern, hce_text):
+    for match in _PAT_SIMPLE_MED_LINE.finditer(hce_text):
         line = match.group(1).strip()
         if not line:
             continue
         
         # Intentar parsear: "cefTRIAXona 1000mg Intravenoso 1 vez al día"
         # Patrón mejorado para capturar componentes
-        parts_match = re.match(
-            r"([A-Za-záéíóúñÁÉÍÓÚÑ]+)\s*"  # fármaco
-            r"([\d.,]+\s*(?:mg|g|ml|mcg|UI|unidades)?)\s*"  # dosis
-            r"(Oral|Intravenoso|IV|IM|SC|Subcutaneo|EV|Tópico|Inhalatoria)?\s*"  # vía
-            r"(.+)?",  # frecuencia
-            line, re.IGNORECASE
-        )
+        parts_match = _PAT_MED_PARTS.match(line)
         
         if parts_match:
             farmaco = parts_match.group(1).strip()
@@ -156,11 +258,12 @@ def extract_medications_simple_format(hce_text: str) -> List[Dict[str, Any]]:
             via = (parts_match.group(3) or "").strip()
             frecuencia = (parts_match.group(4) or "").strip()
         else:
-            # Fallback: tomar toda la línea como fármaco
-            farmaco = line.split()[0] if line.split() else line
+            # Fallback: primera palabra como fármaco, el resto como frecuencia
+            words = line.split()
+            farmaco = words[0] if words else line
             dosis = ""
             via = ""
-            frecuencia = " ".join(line.split()[1:]) if len(line.split()) > 1 else ""
+            frecuencia = " ".join(words[1:])
         
         if farmaco and len(farmaco) > 2:
             medications.append({
@@ -174,76 +277,143 @@ def extract_medications_simple_format(hce_text: str) -> List[Dict[str, Any]]:
     return medications
 
 
-def extract_previous_medications(evolucion_text: str) -> List[Dict[str, Any]]:
+def extract_previous_medications(*texts: str) -> List[Dict[str, Any]]:
     """
     Extrae medicación habitual/previa del paciente.
     Busca patrones como "MH:", "Medicación habitual:", etc.
+    
+    Acepta varios textos (p. ej. evolución, plantillas y HCE completa) y los
+    recorre en orden sin concatenarlos: para cada patrón se usa el primer
+    texto donde aparece.
     """
     medications = []
     
-    patterns = [
-        r"MH:\s*([^.]+\.)",
-        r"Medicación habitual:\s*([^.]+\.)",
-        r"medicación habitual:\s*([^.]+\.)",
-        r"Tratamiento previo:\s*([^.]+\.)",
+    # Los patrones son case-insensitive: se prueba el literal sobre cada texto
+    # en minúsculas antes de correr los regex
+    candidates = [
+        text for text in texts
+        if text and any(tok in text.lower() for tok in _PREV_MEDS_TOKENS)
     ]
+    if not candidates:
+        return medications
     
-    for pattern in patterns:
-        match = re.search(pattern, evolucion_text, re.IGNORECASE)
-        if match:
-            meds_text = match.group(1)
-            meds_parts = re.split(r"[,;]", meds_text)
+    match = _search_first(_PAT_PREV_MEDS, candidates)
+    if match:
+        meds_text = match.group(1)
+        meds_parts = _PAT_MED_SPLIT.split(meds_text)
+        
+        for part in meds_parts:
+            part = part.strip().rstrip(".")
+            if not part or len(part) < 3:
+                continue
             
-            for part in meds_parts:
-                part = part.strip().rstrip(".")
-                if not part or len(part) < 3:
-                    continue
-                
-                farmaco_match = re.match(r"([a-záéíóúñ]+)\s*([\d,./]+\s*m?g)?(?:\s*(.+))?", part, re.IGNORECASE)
+            farmaco_match = _PAT_PREV_MED_PARTS.match(part)
+            
+            if farmaco_match:
+                farmaco = farmaco_match.group(1).strip().capitalize()
+                dosis = (farmaco_match.group(2) or "").strip()
+                frecuencia = (farmaco_match.group(3) or "").strip()
                 
-                if farmaco_match:
-                    farmaco = farmaco_match.group(1).strip().capitalize()
-                    dosis = (farmaco_match.group(2) or "").strip()
-                    frecuencia = (farmaco_match.group(3) or "").strip()
-                    
-                    if farmaco and len(farmaco) > 2:
-                        medications.append({
-                            "tipo": "previa",
-                            "farmaco": farmaco,
-                            "dosis": dosis,
-                            "via": "Oral",
-                            "frecuencia": frecuencia,
-                        })
-            break
+                if farmaco and len(farmaco) > 2:
+                    medications.append({
+                        "tipo": "previa",
+                        "farmaco": farmaco,
+                        "dosis": dosis,
+                        "via": "Oral",
+                        "frecuencia": frecuencia,
+                    })
     
     return medications
 
 
+def _search_first(patterns: Tuple["re.Pattern[str]", ...], texts: List[str]) -> Optional["re.Match[str]"]:
+    """Primer match respetando la prioridad de los patrones y luego el orden de los textos."""
+    for pattern in patterns:
+        for text in texts:
+            match = pattern.search(text)
+            if match:
+                return match
+    return None
+
+
+def _format_fecha_hora(fecha_hora: str) -> str:
+    """
+    "YYYY-MM-DD HH:MM:SS" (ya validado por regex) -> "DD/MM/YYYY HH:MM".
+    La forma canónica (un solo espacio) se corta por posición; el constructor
+    de datetime sólo valida rangos (mes 13, 30 de febrero, etc.). Otros
+    separadores que acepta el regex (`\\s+`: varios espacios, tab) pasan por
+    strptime. Si la fecha no es válida se devuelve tal cual.
+    """
+    f = fecha_hora
+    if len(f) == 19 and f[10] == " ":
+        try:
+            dt = datetime(int(f[0:4]), int(f[5:7]), int(f[8:10]), int(f[11:13]), int(f[14:16]), int(f[17:19]))
+        except ValueError:
+            return fecha_hora
+        return f"{f[8:10]}/{f[5:7]}/{dt.year} {f[11:16]}"
+    try:
+        return datetime.strptime(f, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
+    except ValueError:
+        return fecha_hora
+
+
+def _parse_fecha_sort_key(fecha: Any) -> datetime:
+    """
+    Clave de orden para fechas "DD/MM/YYYY HH:MM" o "DD/MM/YYYY".
+    El formato canónico se parsea por posición; cualquier otra variante cae a
+    strptime para conservar su tolerancia. Sin fecha válida -> datetime.max.
+    """
+    if isinstance(fecha, str):
+        n = len(fecha)
+        if (n == 16 or n == 10) and fecha[2] == "/" and fecha[5] == "/" and (
+            n == 10 or (fecha[10] == " " and fecha[13] == ":")
+        ):
+            parts = (fecha[6:10], fecha[3:5], fecha[0:2]) + ((fecha[11:13], fecha[14:16]) if n == 16 else ())
+            if all(part.isdigit() and part.isascii() for part in parts):
+                try:
+                    return datetime(*map(int, parts))
+                except ValueError:
+                    return datetime.max
+    try:
+        return datetime.strptime(fecha, "%d/%m/%Y %H:%M")
+    except:
+        try:
+            return datetime.strptime(fecha, "%d/%m/%Y")
+        except:
+            return datetime.max
+
+
 def extract_procedures_from_hce(hce_text: str) -> List[Dict[str, Any]]:
     """
     Extrae procedimientos de la HCE. Soporta múltiples formatos.
     """
     procedures = []
     seen = set()
+    if "[" not in hce_text and "Procedimiento" not in hce_text:
+        return procedures
     
     # Formato 1: Con fecha/hora en corchetes
     # - [2025-12-16 11:51:10] PARTE QUIRURGICO #4193726
     #   ARTROPLASTIA TOTAL DE CADERA
-    pattern1 = r"-\s*\[(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})\]\s*([^\n]+)\n\s*([^\n]+)"
+    # Formato 2: Líneas simples "Procedimientos: DESCRIPCION"
+    dated = []
+    simple = []
+    for match in _PAT_PROCS.finditer(hce_text):
+        if match.group("fh") is None:
+            simple.append(match)
+            continue
+        dated.append(match)
+        for inner in _PAT_PROC_SIMPLE_AT.finditer(hce_text, match.start()):
+            if inner.start() >= match.end():
+                break
+            simple.append(inner)
     
-    for match in re.finditer(pattern1, hce_text):
-        fecha_hora = match.group(1)
-        tipo = match.group(2).strip()
-        descripcion = match.group(3).strip()
+    # Los con fecha van primero (tienen prioridad en la deduplicación)
+    for match in dated:
+        descripcion = match.group("desc").strip()
         
         # Parsear fecha/hora
-        try:
-            dt = datetime.strptime(fecha_hora, "%Y-%m-%d %H:%M:%S")
-            fecha_str = dt.strftime("%d/%m/%Y %H:%M")
-        except:
-            fecha_str = fecha_hora
-        
-
+        fecha_str = _format_fecha_hora(match.group("fh"))
         
         key = descripcion.upper()[:50]
         if key not in seen:
@@ -253,16 +423,17 @@ def extract_procedures_from_hce(hce_text: str) -> List[Dict[str, Any]]:
                 "descripcion": descripcion,
             })
     
-    # Formato 2: Líneas simples "Procedimientos: DESCRIPCION"
-    pattern2 = r"Procedimientos?:\s*([^\n]+)"
-    
-    for match in re.finditer(pattern2, hce_text):
-        descripcion = match.group(1).strip()
+    # Los simples no se solapan entre sí (como en un finditer común): se
+    # descarta el que empieza dentro de la línea capturada por el anterior
+    last_end = -1
+    for match in simple:
+        if match.start() < last_end:
+            continue
+        last_end = match.end("desc_simple")
+        descripcion = match.group("desc_simple").strip()
         if not descripcion or len(descripcion) < 5:
             continue
         
-
-        
         key = descripcion.upper()[:50]
         if key not in seen:
             seen.add(key)
@@ -274,58 +445,51 @@ def extract_procedures_from_hce(hce_text: str) -> List[Dict[str, Any]]:
     return procedures
 
 
+def _match_specialty(text_lower: str, start: int, end: int) -> Optional[str]:
+    """
+    Devuelve la especialidad de mayor prioridad mencionada en
+    text_lower[start:end] (texto ya en minúsculas), o None si no aparece
+    ninguna. Si no hay clave del mapa, aplica el fallback por contenido.
+    """
+    hits = {m.group(1) for m in _PAT_SPECIALTY.finditer(text_lower, start, end)}
+    if hits:
+        return _SPECIALTY_BY_LOWER[min(hits, key=_SPECIALTY_PRIORITY.__getitem__)]
+    for kw, val in _SPECIALTY_FALLBACK_KEYWORDS:
+        if text_lower.find(kw, start, end) != -1:
+            return val
+    return None
+
+
 def extract_interconsultas_from_hce(hce_text: str) -> List[Dict[str, Any]]:
     """
     Extrae interconsultas de la HCE. Soporta múltiples formatos.
     """
     interconsultas = []
     seen_specialties = set()
-    
-    # Mapeo de términos a especialidades
-    specialty_map = {
-        "CLINICA MEDICA": "Clínica Médica",
-        "TRAUMATOLOGIA": "Traumatología",
-        "KINESIOLOGIA": "Kinesiología",
-        "CARDIOLOGIA": "Cardiología",
-        "UROLOGIA": "Urología",
-        "NEUROLOGIA": "Neurología",
-        "CIRUGIA": "Cirugía General",
-        "GASTROENTEROLOGIA": "Gastroenterología",
-        "NEUMONOLOGIA": "Neumonología",
-        "INFECTOLOGIA": "Infectología",
-        "UCI": "Terapia Intensiva",
-        "UTI": "Terapia Intensiva",
-    }
+    if "INTERCONSULTA" not in hce_text and "Interconsulta" not in hce_text:
+        return interconsultas
     
     # Formato 1: EVOLUCION DE INTERCONSULTA
-    pattern1 = r"-\s*\[(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})\]\s*EVOLUCION DE INTERCONSULTA"
-    
-    for match in re.finditer(pattern1, hce_text):
+    # Se busca en los 500 caracteres posteriores a cada match, por índices
+    # sobre una única copia en minúsculas de la HCE (creada en el primer
+    # match). Si lower() cambia la longitud (p. ej. "İ"), los índices no se
+    # corresponden y se vuelve a recortar el contexto por match.
+    hce_lower = None
+    for match in _PAT_IC1.finditer(hce_text):
         fecha_hora = match.group(1)
-        context = hce_text[match.end():match.end()+500]
-        
-        especialidad = None
-        for key, val in specialty_map.items():
-            if key.lower() in context.lower():
-                especialidad = val
-                break
+        if hce_lower is None:
+            hce_lower = hce_text.lower()
+            aligned = len(hce_lower) == len(hce_text)
         
-        # Fallback por contenido
-        if not especialidad:
-            if "traumatol" in context.lower() or "cadera" in context.lower():
-                especialidad = "Traumatología"
-            elif "clinic" in context.lower():
-                especialidad = "Clínica Médica"
-            elif "kinesio" in context.lower():
-                especialidad = "Kinesiología"
+        if aligned:
+            especialidad = _match_specialty(hce_lower, match.end(), match.end() + 500)
+        else:
+            ctx_lower = hce_text[match.end():match.end()+500].lower()
+            especialidad = _match_specialty(ctx_lower, 0, len(ctx_lower))
         
         if especialidad and especialidad not in seen_specialties:
             seen_specialties.add(especialidad)
-            try:
-                dt = datetime.strptime(fecha_hora, "%Y-%m-%d %H:%M:%S")
-                fecha_str = dt.strftime("%d/%m/%Y %H:%M")
-            except:
-                fecha_str = fecha_hora
+            fecha_str = _format_fecha_hora(fecha_hora)
             
             interconsultas.append({
                 "fecha": fecha_str,
@@ -333,11 +497,9 @@ def extract_interconsultas_from_hce(hce_text: str) -> List[Dict[str, Any]]:
             })
     
     # Formato 2: INTERCONSULTA ESPECIALIDAD
-    pattern2 = r"INTERCONSULTA\s+([A-Z\s]+?)(?:\n|Obs:|$)"
-    
-    for match in re.finditer(pattern2, hce_text):
+    for match in _PAT_IC2.finditer(hce_text):
         especialidad_raw = match.group(1).strip()
-        especialidad = specialty_map.get(especialidad_raw.upper(), especialidad_raw.title())
+        especialidad = _SPECIALTY_MAP.get(especialidad_raw.upper()) or especialidad_raw.title()
         
         if especialidad and especialidad not in seen_specialties:
             seen_specialties.add(especialidad)
@@ -347,14 +509,12 @@ def extract_interconsultas_from_hce(hce_text: str) -> List[Dict[str, Any]]:
             })
     
     # Formato 3: Líneas simples "Interconsulta: ESPECIALIDAD"
-    pattern3 = r"Interconsultas?:\s*([^\n]+)"
-    
-    for match in re.finditer(pattern3, hce_text):
+    for match in _PAT_IC3.finditer(hce_text):
         especialidad_raw = match.group(1).strip()
         if not especialidad_raw:
             continue
         
-        especialidad = specialty_map.get(especialidad_raw.upper(), especialidad_raw.title())
+        especialidad = _SPECIALTY_MAP.get(especialidad_raw.upper()) or especialidad_raw.title()
         
         if especialidad and especialidad not in seen_specialties:
             seen_specialties.add(especialidad)
@@ -370,37 +530,27 @@ def extract_interconsultas_from_hce(hce_text: str) -> List[Dict[str, Any]]:
 # PROMPTS POR SECCIÓN
 # =============================================================================
 
-PROMPT_MOTIVO_EVOLUCION = """
-Analiza el siguiente texto de Historia Clínica y genera:
-1. motivo_internacion: Una frase clara del motivo de internación
-2. evolucion: Texto médico técnico (2-4 párrafos) describiendo cronológicamente la evolución
+# Los templates viven en app/services/prompts/*.txt (formato str.format) y se
+# leen recién en el primer uso; load_prompt los cachea para el proceso.
+_PROMPTS_DIR = Path(__file__).resolve().parent / "prompts"
 
-REGLAS:
-- Lenguaje médico técnico, estilo pase entre colegas
-- Describir: antecedentes → motivo ingreso → evaluación inicial → tratamiento → evolución hasta el alta
-- NO mencionar fármacos específicos en evolución (van en medicación)
-- NO inventar datos que no estén en la HCE
 
-Responde SOLO con JSON:
-{{"motivo_internacion": "...", "evolucion": "..."}}
-
-HCE:
-\"\"\"
-{hce_text}
-\"\"\"
-"""
+@lru_cache(maxsize=None)
+def load_prompt(name: str) -> str:
+    """Lee (una vez) el template de prompt `name` desde app/services/prompts."""
+    return (_PROMPTS_DIR / name).read_text(encoding="utf-8")
 
-PROMPT_DIAGNOSTICO = """
-Del siguiente texto, extrae el diagnóstico principal CIE-10 si está disponible.
 
-Responde SOLO con JSON:
-{{"diagnostico_principal_cie10": "CÓDIGO - DESCRIPCIÓN" o ""}}
-
-HCE:
-\"\"\"
-{hce_text}
-\"\"\"
-"""
+@lru_cache(maxsize=None)
+def load_prompt_parts(name: str, field: str) -> Tuple[str, str]:
+    """
+    Template `name` ya renderizado y partido alrededor de su único campo
+    `{field}` (las llaves escapadas quedan resueltas). Permite armar el prompt
+    con un join, sin que str.format re-escanee el texto en cada llamada.
+    """
+    sentinel = "\x00"
+    pre, post = load_prompt(name).format(**{field: sentinel}).split(sentinel)
+    return pre, post
 
 
 # =============================================================================
@@ -417,32 +567,29 @@ def sort_medications_alphabetically(medications: List[Dict[str, Any]]) -> Dict[s
     - "previa": medicación habitual previa del paciente
     - "all": todas concatenadas (para compatibilidad)
     """
-    # Separar por tipo
-    internacion = [m for m in medications if m.get("tipo") != "previa"]
-    previa = [m for m in medications if m.get("tipo") == "previa"]
+    # Una sola pasada: separar por tipo y eliminar duplicados por fármaco en
+    # dicts {fármaco normalizado: (nombre en minúsculas, med)}. Entre
+    # duplicados se conserva el que quedaría primero al ordenar (menor nombre
+    # en minúsculas; a igualdad, el primero de la entrada).
+    groups: Dict[str, Dict[str, Tuple[str, Dict[str, Any]]]] = {"internacion": {}, "previa": {}}
+    for m in medications:
+        farmaco_lower = (m.get("farmaco") or "").lower()
+        farmaco = farmaco_lower.strip()
+        if not farmaco:
+            continue
+        group = groups["previa" if m.get("tipo") == "previa" else "internacion"]
+        current = group.get(farmaco)
+        if current is None or farmaco_lower < current[0]:
+            group[farmaco] = (farmaco_lower, m)
     
     # Ordenar cada grupo alfabéticamente
-    internacion.sort(key=lambda m: (m.get("farmaco") or "").lower())
-    previa.sort(key=lambda m: (m.get("farmaco") or "").lower())
-    
-    # Eliminar duplicados por fármaco (mismo fármaco = mantener el primero)
-    def deduplicate(meds: List[Dict]) -> List[Dict]:
-        seen = set()
-        unique = []
-        for m in meds:
-            farmaco = (m.get("farmaco") or "").lower().strip()
-            if farmaco and farmaco not in seen:
-                seen.add(farmaco)
-                unique.append(m)
-        return unique
-    
-    internacion = deduplicate(internacion)
-    previa = deduplicate(previa)
+    internacion = [m for _, m in sorted(groups["internacion"].values(), key=lambda item: item[0])]
+    previa = [m for _, m in sorted(groups["previa"].values(), key=lambda item: item[0])]
     
     return {
         "internacion": internacion,
         "previa": previa,
-        "all": internacion + previa  # Para compatibilidad con código antiguo
+        "all": [*internacion, *previa]  # Para compatibilidad con código antiguo
     }
 
 
@@ -451,22 +598,10 @@ def sort_procedures_chronologically(procedures: List[Dict[str, Any]]) -> List[st
     Ordena procedimientos cronológicamente y formatea como strings.
     """
     # Intentar parsear fechas para ordenar
-    def parse_date(p):
-        fecha = p.get("fecha", "")
-        try:
-            # Formato esperado: "DD/MM/YYYY HH:MM"
-            return datetime.strptime(fecha, "%d/%m/%Y %H:%M")
-        except:
-            try:
-                return datetime.strptime(fecha, "%d/%m/%Y")
-            except:
-                return datetime.max
-    
-    sorted_procs = sorted(procedures, key=parse_date)
+    sorted_procs = sorted(procedures, key=lambda p: _parse_fecha_sort_key(p.get("fecha", "")))
     
     # Formatear como strings
     result = []
-    from app.services.hce_json_parser import _medical_title_case
     for p in sorted_procs:
         fecha = p.get("fecha", "")
         descripcion = _medical_title_case(p.get("descripcion", "") or p.get("tipo", ""))
@@ -503,34 +638,15 @@ def sort_interconsultas_alphabetically(interconsultas: List[Dict[str, Any]]) ->
 # GENERACIÓN PRINCIPAL
 # =============================================================================
 
-async def generate_epc_by_sections(
+def _extract_structured_data(
+    sections: Dict[str, str],
     hce_text: str,
-    patient_id: Optional[str] = None,
-) -> Dict[str, Any]:
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
-    Genera EPC procesando la HCE por secciones.
-    
-    Flujo:
-    1. Parsear HCE en secciones
-    2. Extraer datos estructurados (medicación, procedimientos, interconsultas)
-    3. Generar motivo/evolución con IA
-    4. Ordenar y formatear todo
-    5. Retornar estructura EPC completa
+    Paso 2 de generate_epc_by_sections: extractores regex (CPU puro, sin I/O).
+    Devuelve (meds_internacion, meds_previa, procedures, interconsultas).
     """
-    from app.services.ai_gemini_service import GeminiAIService
-    
-    log.info("[SectionGenerator] Iniciando generación por secciones")
-    
-    # DEBUG: Guardar muestra del texto para diagnóstico
-    print(f"[SectionGenerator] HCE text length: {len(hce_text)}")
-    print(f"[SectionGenerator] HCE primeros 500 chars: {hce_text[:500]}")
-    
-    # 1. Parsear secciones (para formato estructurado)
-    sections = parse_hce_sections(hce_text)
-    sections_found = [k for k,v in sections.items() if v and len(v) > 10]
-    print(f"[SectionGenerator] Secciones con contenido: {sections_found}")
-    
-    # 2. Extraer datos estructurados - INTENTAR AMBOS FORMATOS
+    debug = log.isEnabledFor(logging.DEBUG)
     
     # 2.a Medicación de internación - Formato estructurado
     meds_internacion = extract_medications_from_indicaciones(sections.get("indicaciones", ""))
@@ -539,83 +655,137 @@ async def generate_epc_by_sections(
     if not meds_internacion:
         meds_internacion = extract_medications_simple_format(hce_text)
     
-    print(f"[SectionGenerator] Medicamentos internación: {len(meds_internacion)}")
-    if meds_internacion:
-        print(f"[SectionGenerator] Meds encontrados: {[m['farmaco'] for m in meds_internacion[:5]]}")
+    log.debug("[SectionGenerator] Medicamentos internación: %d", len(meds_internacion))
+    if debug and meds_internacion:
+        log.debug("[SectionGenerator] Meds encontrados: %s", [m['farmaco'] for m in meds_internacion[:5]])
     
     # 2.b Medicación previa
-    meds_previa = extract_previous_medications(sections.get("evolucion", "") + sections.get("plantillas", "") + hce_text)
-    print(f"[SectionGenerator] Medicamentos previos: {len(meds_previa)}")
+    meds_previa = extract_previous_medications(sections.get("evolucion", ""), sections.get("plantillas", ""), hce_text)
+    log.debug("[SectionGenerator] Medicamentos previos: %d", len(meds_previa))
     
     # 2.c Procedimientos
     procedures = extract_procedures_from_hce(hce_text)
-    print(f"[SectionGenerator] Procedimientos: {len(procedures)}")
-    if procedures:
-        print(f"[SectionGenerator] Procs encontrados: {[p['descripcion'][:30] for p in procedures[:5]]}")
+    log.debug("[SectionGenerator] Procedimientos: %d", len(procedures))
+    if debug and procedures:
+        log.debug("[SectionGenerator] Procs encontrados: %s", [p['descripcion'][:30] for p in procedures[:5]])
     
     # 2.d Interconsultas
     interconsultas = extract_interconsultas_from_hce(hce_text)
-    print(f"[SectionGenerator] Interconsultas: {len(interconsultas)}")
-    
-    # 3. Generar motivo/evolución con IA
-    ai = GeminiAIService()
-    # REGLA EXPLÍCITA: Recorrer 100% de la HCE sin truncar
-    # Gemini 2.0 Flash tiene 1M tokens, no hay límite práctico para HCEs típicas
-    prompt = PROMPT_MOTIVO_EVOLUCION.format(hce_text=hce_text)
+    log.debug("[SectionGenerator] Interconsultas: %d", len(interconsultas))
     
-    # 🏆 Inyectar Golden Rules al prompt
-    try:
-        from app.services.golden_rules_service import get_golden_rules_for_prompt
-        golden_rules = await get_golden_rules_for_prompt()
-        if golden_rules:
-            prompt = golden_rules + "\n\n" + prompt
-            print(f"[SectionGenerator] Golden Rules injected: {len(golden_rules)} chars")
-    except Exception as e:
-        print(f"[SectionGenerator] Could not load Golden Rules: {e}")
-    
-    try:
-        raw_result = await ai.generate_epc(prompt)
+    return meds_internacion, meds_previa, procedures, interconsultas
+
+
+async def _generate_motivo_evolucion(hce_text: str) -> Tuple[str, str]:
+    """
+    Paso 3 de generate_epc_by_sections: motivo de internación y evolución
+    generados con Gemini. Devuelve ("", "") si la HCE está vacía o falla la IA.
+    """
+    # Sin texto de HCE no hay nada que resumir: se evita la llamada a Gemini
+    motivo = ""
+    evolucion = ""
+    if not hce_text or not hce_text.strip():
+        log.info("[SectionGenerator] HCE vacía: se omite la generación de motivo/evolución con IA")
+    else:
+        ai = GeminiAIService()
+        # REGLA EXPLÍCITA: Recorrer 100% de la HCE sin truncar
+        # Gemini 2.0 Flash tiene 1M tokens, no hay límite práctico para HCEs típicas
+        prompt_pre, prompt_post = load_prompt_parts("motivo_evolucion.txt", "hce_text")
+        prompt_parts = [prompt_pre, hce_text, prompt_post]
+    
+        # 🏆 Inyectar Golden Rules al prompt
+        try:
+            from app.services.golden_rules_service import get_golden_rules_for_prompt
+            golden_rules = await get_golden_rules_for_prompt()
+            if golden_rules:
+                prompt_parts[:0] = (golden_rules, "\n\n")
+                log.debug("[SectionGenerator] Golden Rules injected: %d chars", len(golden_rules))
+        except Exception as e:
+            log.warning("[SectionGenerator] Could not load Golden Rules: %s", e)
         
-        # Parsear respuesta JSON
-        motivo = ""
-        evolucion = ""
+        # Un único join arma el prompt completo (sin copias intermedias)
+        prompt = "".join(prompt_parts)
+    
+        try:
+            raw_result = await ai.generate_epc(prompt)
         
-        if isinstance(raw_result, dict):
-            if "json" in raw_result:
-                data = raw_result["json"]
-            elif "raw_text" in raw_result:
-                import json
-                try:
-                    text = raw_result["raw_text"]
-                    # Limpiar markdown
-                    if "```" in text:
-                        text = re.sub(r"```json\s*", "", text)
-                        text = re.sub(r"```\s*", "", text)
-                    data = json.loads(text)
-                except:
-                    data = {}
-            else:
-                data = raw_result
+            # Parsear respuesta JSON
+            if isinstance(raw_result, dict):
+                if "json" in raw_result:
+                    data = raw_result["json"]
+                elif "raw_text" in raw_result:
+                    try:
+                        text = raw_result["raw_text"]
+                        # Limpiar markdown (apertura ```json y cierre ``` en una pasada)
+                        if "```" in text:
+                            text = _PAT_MD_FENCE.sub("", text)
+                        data = _json_loads(text)
+                    except:
+                        data = {}
+                else:
+                    data = raw_result
             
-            motivo = data.get("motivo_internacion", "")
-            evolucion = data.get("evolucion", "")
+                motivo = data.get("motivo_internacion", "")
+                evolucion = data.get("evolucion", "")
         
-        log.info(f"[SectionGenerator] Motivo/Evolución generados")
-    except Exception as e:
-        log.error(f"[SectionGenerator] Error generando motivo/evolución: {e}")
-        motivo = ""
-        evolucion = ""
+            log.info("[SectionGenerator] Motivo/Evolución generados")
+        except Exception as e:
+            log.error("[SectionGenerator] Error generando motivo/evolución: %s", e)
+            motivo = ""
+            evolucion = ""
+    
+    return motivo, evolucion
+
+
+async def generate_epc_by_sections(
+    hce_text: str,
+    patient_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Genera EPC procesando la HCE por secciones.
+    
+    Flujo:
+    1. Parsear HCE en secciones
+    2. Extraer datos estructurados (medicación, procedimientos, interconsultas)
+    3. Generar motivo/evolución con IA
+    4. Ordenar y formatear todo
+    5. Retornar estructura EPC completa
+    """
+    log.info("[SectionGenerator] Iniciando generación por secciones")
+    
+    # DEBUG: muestra del texto para diagnóstico (el slice sólo se arma si el
+    # nivel DEBUG está habilitado)
+    debug = log.isEnabledFor(logging.DEBUG)
+    if debug:
+        log.debug("[SectionGenerator] HCE text length: %d", len(hce_text))
+        log.debug("[SectionGenerator] HCE primeros 500 chars: %s", hce_text[:500])
+    
+    # 1. Parsear secciones (para formato estructurado)
+    sections = parse_hce_sections(hce_text)
+    if debug:
+        sections_found = [k for k,v in sections.items() if v and len(v) > 10]
+        log.debug("[SectionGenerator] Secciones con contenido: %s", sections_found)
+    
+    # 2. Extraer datos estructurados (en un thread: no bloquea el event loop)
+    # 3. Generar motivo/evolución con IA
+    # Ambos pasos son independientes, así que la extracción corre mientras se
+    # espera la respuesta de Gemini.
+    (meds_internacion, meds_previa, procedures, interconsultas), (motivo, evolucion) = await asyncio.gather(
+        asyncio.to_thread(_extract_structured_data, sections, hce_text),
+        _generate_motivo_evolucion(hce_text),
+    )
     
     # 4. Extraer diagnóstico de la HCE directamente
     diagnostico = ""
-    diag_match = re.search(r"•\s*([A-Z][^\n]+\([A-Z0-9.]+\))", hce_text)
+    diag_match = _PAT_DIAG.search(hce_text)
     if diag_match:
         diagnostico = diag_match.group(1).strip()
     
     # 5. Ordenar y formatear
     # 5.a Medicación: ordenar alfabéticamente
-    all_medications = meds_internacion + meds_previa
-    medications_dict = sort_medications_alphabetically(all_medications)
+    medications_dict = sort_medications_alphabetically([*meds_internacion, *meds_previa])
+    meds_int = medications_dict["internacion"]
+    meds_prev = medications_dict["previa"]
     
     # 5.b Procedimientos: ordenar cronológicamente
     sorted_procedures = sort_procedures_chronologically(procedures)
@@ -630,22 +800,20 @@ async def generate_epc_by_sections(
         "evolucion": evolucion,
         "procedimientos": sorted_procedures,
         "interconsultas": sorted_interconsultas,
-        "medicacion_internacion": medications_dict["internacion"],  # Nueva - durante internación
-        "medicacion_previa": medications_dict["previa"],            # Nueva - habitual previa
-        "medicacion": medications_dict["all"],                      # Compatibilidad
+        "medicacion_internacion": meds_int,   # Nueva - durante internación
+        "medicacion_previa": meds_prev,       # Nueva - habitual previa
+        "medicacion": medications_dict["all"],  # Compatibilidad
         "indicaciones_alta": [],  # El médico lo completa manualmente
         "notas_alta": [],
         "_generated_by": "section_generator",
         "_sections_parsed": list(sections.keys()),
     }
     
-    log.info(f"[SectionGenerator] EPC generada: procedimientos={len(sorted_procedures)}, "
-             f"interconsultas={len(sorted_interconsultas)}, "
-             f"medicacion_internacion={len(medications_dict['internacion'])}, "
-             f"medicacion_previa={len(medications_dict['previa'])}")
+    log.info("[SectionGenerator] EPC generada: procedimientos=%d, interconsultas=%d, "
+             "medicacion_internacion=%d, medicacion_previa=%d",
+             len(sorted_procedures), len(sorted_interconsultas), len(meds_int), len(meds_prev))
     
     # 7. ⚠️ POST-PROCESAMIENTO OBLIGATORIO: Aplicar reglas críticas (incluida regla de óbito)
-    from app.services.ai_langchain_service import _post_process_epc_result, _load_section_dictionary
     dictionary_rules = await _load_section_dictionary()
     result = _post_process_epc_result(result, dictionary_rules=dictionary_rules)
     log.info("[SectionGenerator] Post-procesamiento de reglas aplicado (incluida regla de óbito, %d dictionary rules)", len(dictionary_rules))
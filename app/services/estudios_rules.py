@@ -329,6 +329,8 @@ CATEGORIA_A_GRUPO = {
 # ÍNDICE INVERSO: TÉRMINO -> (CATEGORÍA, ABREVIATURA, NOMBRE COMPLETO)
 # =============================================================================
 _INDICE_ESTUDIOS: Dict[str, Tuple[str, str, str]] = {}
+# Abreviaturas cortas (≤3 caracteres) -> regex de palabra completa, compilada una vez
+_PATRONES_ABREV_CORTA: Dict[str, re.Pattern] = {}
 
 def _build_index():
     """Construye el índice inverso de estudios para búsqueda rápida."""
@@ -343,6 +345,10 @@ def _build_index():
             # Agregar por nombre completo
             _INDICE_ESTUDIOS[nombre.upper()] = (categoria, abrev, nombre)
 
+    for termino in _INDICE_ESTUDIOS:
+        if len(termino) <= 3:
+            _PATRONES_ABREV_CORTA[termino] = re.compile(r'\b' + re.escape(termino) + r'\b')
+
 _build_index()
 
 
@@ -404,9 +410,8 @@ def clasificar_estudio(texto: str) -> Optional[Dict[str, str]]:
     for abrev, (categoria, ab, nombre) in _INDICE_ESTUDIOS.items():
         if len(abrev) <= 3:
             # Para abreviaturas cortas: buscar como palabra completa
-            # Usar regex con word boundaries
-            pattern = r'\b' + re.escape(abrev) + r'\b'
-            if re.search(pattern, texto_upper):
+            # Usar regex con word boundaries (precompilada en _build_index)
+            if _PATRONES_ABREV_CORTA[abrev].search(texto_upper):
                 return {
                     "categoria": categoria,
                     "grupo": CATEGORIA_A_GRUPO.get(categoria, "Otros"),
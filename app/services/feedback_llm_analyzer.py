@@ -23,6 +23,11 @@ _analysis_cache: Dict[str, Any] = {}
 _cache_ttl_hours = 24
 
 
+def _rule_text_key(text: str) -> str:
+    """Clave normalizada (primeros 50 caracteres, minúsculas) para deduplicar reglas."""
+    return (text or "")[:50].lower()
+
+
 class FeedbackLLMAnalyzer:
     """Analizador de feedback usando LLM para generar insights profesionales."""
     
@@ -552,15 +557,25 @@ Responde SOLO el JSON en ESPAÑOL, sin explicaciones adicionales."""
         for rule in rules:
             rule_text = rule.get("text", "")
             rule_status = rule.get("status", "pending")
+            text_key = _rule_text_key(rule_text)
             
-            # Buscar regla existente por texto similar (primeros 50 caracteres, escapado)
-            # Escapar caracteres especiales de regex para evitar errores
-            escaped_text = re.escape(rule_text[:50])
+            # Buscar regla existente por texto similar (primeros 50 caracteres, escapado).
+            # Prefijo anclado y sensible a mayúsculas sobre text_key (ya en minúsculas):
+            # lo resuelve el índice (section, text_key) sin recorrer la colección.
+            escaped_key = re.escape(text_key)
             try:
                 existing = await mongo.learning_rules.find_one({
                     "section": section_key,
-                    "text": {"$regex": f"^{escaped_text}", "$options": "i"}
+                    "text_key": {"$regex": f"^{escaped_key}"}
                 })
+                if not existing:
+                    # Reglas previas sin text_key: regex case-insensitive solo sobre ellas
+                    escaped_text = re.escape(rule_text[:50])
+                    existing = await mongo.learning_rules.find_one({
+                        "section": section_key,
+                        "text_key": {"$exists": False},
+                        "text": {"$regex": f"^{escaped_text}", "$options": "i"}
+                    })
             except Exception:
                 # Si falla el regex, buscar por sección
                 existing = None
@@ -571,6 +586,9 @@ Responde SOLO el JSON en ESPAÑOL, sin explicaciones adicionales."""
                     "$set": {"last_seen_at": datetime.utcnow()},
                     "$inc": {"times_detected": 1}
                 }
+                if "text_key" not in existing:
+                    # Migrar la regla previa al camino indexado
+                    update_data["$set"]["text_key"] = _rule_text_key(existing.get("text", ""))
                 # Si el status cambió a applied, actualizar
                 if rule_status == "applied" and existing.get("status") != "applied":
                     update_data["$set"]["status"] = "applied"
@@ -582,6 +600,7 @@ Responde SOLO el JSON en ESPAÑOL, sin explicaciones adicionales."""
                 new_rule = {
                     "section": section_key,
                     "text": rule_text,
+                    "text_key": text_key,
                     "status": rule_status,
                     "source": "llm_analysis",
                     "created_at": datetime.utcnow(),
@@ -373,33 +373,25 @@ class HCEAinsteinParser:
         
         # Crear chunks de indicaciones agrupadas por fecha
         for fecha_key, indicaciones in indicaciones_por_fecha.items():
-            content_parts = []
+            content_parts: List[str] = []
+            add_part = content_parts.append
             
             for ind in indicaciones:
                 # Farmacológicas
-                farm = ind.get("indicacionFarmacologica", [])
-                if farm:
-                    for med in farm:
-                        gene = med.get("geneDescripcion", "")
-                        dosis = med.get("enmeDosis", "")
-                        via = med.get("meviDescripcion", "")
-                        frec = med.get("mefrDescripcion", "")
-                        content_parts.append(f"MEDICACIÓN: {gene} {dosis} {via} {frec}")
+                for med in ind.get("indicacionFarmacologica") or ():
+                    get = med.get
+                    add_part(
+                        f"MEDICACIÓN: {get('geneDescripcion', '')} {get('enmeDosis', '')} "
+                        f"{get('meviDescripcion', '')} {get('mefrDescripcion', '')}"
+                    )
                 
                 # Procedimientos
-                proc = ind.get("indicacionProcedimientos", [])
-                if proc:
-                    for p in proc:
-                        desc = p.get("procDescripcion", "")
-                        obs = p.get("enprObservacion", "")
-                        content_parts.append(f"PROCEDIMIENTO: {desc} - {obs}")
+                for p in ind.get("indicacionProcedimientos") or ():
+                    add_part(f"PROCEDIMIENTO: {p.get('procDescripcion', '')} - {p.get('enprObservacion', '')}")
                 
                 # Enfermería
-                enf = ind.get("indicacionEnfermeria", [])
-                if enf:
-                    for e in enf:
-                        desc = e.get("indiDescripcion", "")
-                        content_parts.append(f"ENFERMERÍA: {desc}")
+                for e in ind.get("indicacionEnfermeria") or ():
+                    add_part(f"ENFERMERÍA: {e.get('indiDescripcion', '')}")
             
             if content_parts:
                 content = f"INDICACIONES del {fecha_key}:\n" + "\n".join(content_parts)
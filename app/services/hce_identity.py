@@ -0,0 +1,81 @@
+# app/services/hce_identity.py
+"""
+Normalización de la identidad de paciente en documentos HCE.
+
+Las integraciones guardan el id de paciente de formas distintas (string,
+UUID Binary subtype 4, `patientId`, `paciente.id`, ...). Al ingresar cada HCE
+se escribe una forma canónica:
+
+- `patient_id`: UUID como string canónico (minúsculas, con guiones) o el id tal cual.
+- `patient_uuid`: el mismo UUID como Binary subtype 4 (si el id es un UUID).
+
+Con todos los documentos normalizados (ver scripts/backfill_hce_patient_id.py)
+la búsqueda por paciente es una sola igualdad sobre `patient_id`.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from bson.binary import Binary, UUID_SUBTYPE
+
+# Campos donde distintas integraciones guardan el id de paciente (en orden de prioridad)
+PATIENT_ID_FIELDS = ("patient_id", "patient.id", "patientId", "paciente_id", "paciente.id")
+
+
+def _as_uuid(val: Any) -> Optional[UUID]:
+    if isinstance(val, UUID):
+        return val
+    if isinstance(val, Binary) and val.subtype == UUID_SUBTYPE:
+        return UUID(bytes=bytes(val))
+    if isinstance(val, str):
+        try:
+            return UUID(val.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def canonical_patient_id(val: Any) -> Optional[str]:
+    """Forma canónica (string) del id de paciente; None si está vacío."""
+    if val is None:
+        return None
+    u = _as_uuid(val)
+    if u is not None:
+        return str(u)
+    if isinstance(val, Binary):
+        return None
+    s = str(val).strip()
+    return s or None
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    node: Any = doc
+    for part in path.split("."):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part)
+    return node
+
+
+def hce_identity_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Campos canónicos (`patient_id` y, si corresponde, `patient_uuid`) a partir
+    del primer campo de identidad con valor. Vacío si el HCE no tiene paciente.
+    """
+    for field in PATIENT_ID_FIELDS:
+        pid = canonical_patient_id(_get_path(doc, field))
+        if pid:
+            out: Dict[str, Any] = {"patient_id": pid}
+            u = _as_uuid(pid)
+            if u is not None:
+                out["patient_uuid"] = Binary(u.bytes, UUID_SUBTYPE)
+            return out
+    return {}
+
+
+def normalize_hce_identity(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica in-place los campos canónicos de identidad al HCE (antes de insertarlo)."""
+    doc.update(hce_identity_fields(doc))
+    return doc
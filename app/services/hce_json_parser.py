@@ -85,6 +85,18 @@ _LAB_KEYWORDS_GLOBAL = [
 ]
 
 
+# Soluciones de hidratación: no se listan como medicación
+_SOLUTION_RE = re.compile("SOLUCION|DEXTROSA|FISIOLOGICA|RINGER")
+
+
+def _keyword_alternation(keywords: List[str]) -> "re.Pattern[str]":
+    """
+    Compila una lista de keywords literales a una alternancia: un único
+    search equivale a `any(kw in texto for kw in keywords)`.
+    """
+    return re.compile("|".join(map(re.escape, keywords)))
+
+
 def _is_lab_item(text: str) -> bool:
     """Returns True if the text corresponds to a lab/blood test, NOT a diagnostic study."""
     if not text:
@@ -541,12 +553,13 @@ def parse_hce_json(hce_doc: Dict[str, Any]) -> Dict[str, Any]:
             if farmaco.startswith("."):
                 farmaco = farmaco[1:]
             
-            # Excluir soluciones de hidratación
-            if any(sol in farmaco.upper() for sol in ["SOLUCION", "DEXTROSA", "FISIOLOGICA", "RINGER"]):
+            # Excluir soluciones de hidratación (la versión en mayúsculas
+            # también es la clave de deduplicación)
+            key = farmaco.upper()
+            if _SOLUTION_RE.search(key):
                 continue
             
             # Crear clave única para deduplicar
-            key = farmaco.upper()
             if key in seen_meds:
                 continue
             seen_meds.add(key)
@@ -844,6 +857,106 @@ def sort_medications_alphabetically(medications: List[Dict[str, Any]]) -> List[D
     
     return internacion + previa
 
+
+# =============================================================================
+# LISTA NEGRA EXTENSA DE PROCEDIMIENTOS GENÉRICOS A OCULTAR
+# Según REGLAS_GENERACION_EPC.md: NO son procedimientos invasivos/intervencionistas
+# =============================================================================
+_GENERIC_PROCEDURES_BLACKLIST = [
+    # Administrativo / Ingreso
+    "RECEPCION Y TOMA DE MUESTRA",
+    "MATERIAL DESCARTABLE",
+    "INTERNACION GENERAL",
+    "INTERNACION SIN AISLAMIENTO",
+    "INTERNACION UCI", "INTERNACION UTI",
+    "INGRESO",
+
+    # Cuidados post-mortem
+    "CUIDADOS POSTMORTEN", "CUIDADOS POST MORTEM", "CUIDADOS POSTMORTEM",
+
+    # Alimentación (rutinario)
+    "ALIMENTACION ENTERAL",
+
+    # Rutinas de enfermería - NO SON PROCEDIMIENTOS
+    "SONDA NASOGASTRICA",
+    "ASPIRACION SECRECIONES", "ASPIRACION DE SECRECIONES",
+    "DRENAJE - CONTROL", "DRENAJE CONTROL", "CONTROL Y MEDICION",
+    "SUJECION DEL TUBO", "SUJECION DE TUBO", "FIJACION DEL TUBO",
+    "HIGIENE", "HIGIENE CONFORT", "BAÑO EN CAMA",
+    "CAMBIO DE POSICION", "MOVILIZACION PASIVA",
+    "CURACION PLANA", "CURACION SIMPLE",
+    "CAMBIO DE PAÑAL", "CONTROL DE DEPOSICIONES",
+    "CONTROL DEL DOLOR", "ESCALA DE DOLOR",
+    "MEDICION DE DIURESIS", "BALANCE HIDRICO",
+
+    # Controles genéricos - NO SON PROCEDIMIENTOS
+    "CONTROL DE", "SIGNOS VITALES", "SATURACION", "TEMPERATURA",
+    "FRECUENCIA CARDIACA", "FRECUENCIA RESPIRATORIA",
+    "TENSION ARTERIAL", "PRESION ARTERIAL",
+    "VALORACION INICIAL", "VALORACION DE ENFERMERIA",
+    "MONITOREO CONTINUO", "MONITOREO CARDIACO",
+
+    # Observación/Conductas - van en Evolución, no en Procedimientos
+    "OBSERVACION", "CONTROL EVOLUTIVO", "SEGUIMIENTO",
+    "EVALUACION CLINICA", "VALORACION CLINICA",
+]
+
+# Keywords para identificar laboratorios: se agrupan en procedimientos
+# (sort_and_group_procedures) y se listan en "Otros Datos de Interés"
+# (extract_lab_procedures)
+_PROC_LAB_KEYWORDS = [
+    "LABORATORIO", "HEMOGRAMA", "PLAQUETAS", "COAGULACION",
+    "TROMBOPLASTINA", "PROTROMBINA", "ORINA COMPLETA",
+    "ERITROSEDIMENTACION", "HEMOGLOBINA GLICOSILADA", "HB A1C",
+    "PROTEINOGRAMA", "ACIDO FOLICO", "FERREMIA", "RETICULOCITOS",
+    "CEA", "CA 19-9", "CAPACIDAD TOTAL DE FIJACION", "ANTICUERPO",
+    "ANTITIROGLOBULINA", "ATPO-ANTIPEROXIDASA", "PRO BNP",
+    "PARATHORMONA", "VIT D", "25-OH-VIT", "IONOGRAMA", "GASOMETRIA",
+    "GLUCEMIA", "UREMIA", "CREATININA", "HEPATOGRAMA", "GOT", "GPT",
+    "BILIRRUBINA", "ALBUMINA", "PROTEINAS TOTALES", "CULTIVO",
+    "HEMOCULTIVO", "UROCULTIVO", "COPROCULTIVO",
+    "COAGULOGRAMA", "CALCEMIA", "MAGNESIO", "LACTICO", "LÁCTICO", "LDH",
+    "FOSFATEMIA", "ACIDO BASE", "ÁCIDO BASE", "GASOMETRÍA", "COLESTEROL", "TRIGLICERIDOS",
+    "TRIGLICÉRIDOS", "URICEMIA", "PROTEINAS", "PROTEÍNAS", "ALBÚMINA", "AMILASA",
+    "LIPASA", "PCR", "VSG", "ERITROSEDIMENTACIÓN", "FERRITINA", "TRANSFERRINA",
+    "VITAMINA", "HORMONAS", "TSH", "T3", "T4", "HISOPADO",
+    "CALCIO IONICO", "CALCIO IÓNICO", "FOSFORO", "FÓSFORO", "POTASIO", "SODIO",
+    "CLORO", "BICARBONATO", "UREA", "TRANSAMINASAS", "FOSFATASA", "GGT",
+    "GAMMA GT", "TIEMPO DE PROTROMBINA", "TPPA", "DIMERO D", "FIBRINOGENO", "FIBRINÓGENO",
+]
+
+# Estudios de imagen (van en sección "Estudios" separada), salvo que
+# sean invasivos (biopsia/punción son procedimientos)
+_STUDY_KEYWORDS = [
+    "RX ", "RADIOGRAFIA", "TAC ", "TOMOGRAFIA", "RMN ", "RESONANCIA",
+    "ECOGRAFIA", "ECOCARDIOGRAMA", "CENTELLOGRAMA", "SPECT",
+    "MAMOGRAFIA", "DENSITOMETRIA", "DOPPLER", "ECODOPLER", "ECODOPPLER",
+    "VEDA ", "VCC", "ENDOSCOPIA DIGESTIVA", "COLONOSCOPIA", "BRONCOSCOPIA",
+    "ELECTROCARDIOGRAMA", "ECG", "HOLTER", "ERGOMETRIA",
+]
+_INVASIVE_KEYWORDS = ["BIOPSIA", "PUNCION", "COLOCACION", "CATETERISMO"]
+
+# Más keywords a ocultar (rutina que no entra en categorías)
+_PROC_SKIP_KEYWORDS = [
+    "OBSERVACION", "SUEÑO", "REPOSO", "PASE DE",
+    "REGISTROS", "CONFECCION", "ARREGLO", "ORDEN DE",
+    "INFORMACION AL", "ENTREVISTA", "AVISO",
+    "RETIRAR VIA", "PERMEABILIDAD", "ACCESO VENOSO",
+    "VALORACION DLEE", "VALORACION DE", "VALORACION DEL",
+    "PULSERA", "TRASLADO", "CABECERA", "BARANDAS",
+    "DECUBITO", "ALMOHADA", "CHATA", "ORINAL",
+    "INTERCONSULTA",  # Las interconsultas van en su sección propia
+]
+
+# Cada lista se compila a una alternancia: una pasada por descripción
+# en lugar de un `in` por keyword
+_PROC_LAB_RE = _keyword_alternation(_PROC_LAB_KEYWORDS)
+_PROC_BLACKLIST_RE = _keyword_alternation(_GENERIC_PROCEDURES_BLACKLIST)
+_STUDY_RE = _keyword_alternation(_STUDY_KEYWORDS)
+_INVASIVE_RE = _keyword_alternation(_INVASIVE_KEYWORDS)
+_PROC_SKIP_RE = _keyword_alternation(_PROC_SKIP_KEYWORDS)
+
+
 def sort_and_group_procedures(
     procedures: List[Dict[str, Any]],
     excluded_sections: Optional[List[str]] = None,
@@ -868,63 +981,6 @@ def sort_and_group_procedures(
     """
     from collections import defaultdict
     
-    # =========================================================================
-    # LISTA NEGRA EXTENSA DE PROCEDIMIENTOS GENÉRICOS A OCULTAR
-    # Según REGLAS_GENERACION_EPC.md: NO son procedimientos invasivos/intervencionistas
-    # =========================================================================
-    GENERIC_PROCEDURES_BLACKLIST = [
-        # Administrativo / Ingreso
-        "RECEPCION Y TOMA DE MUESTRA",
-        "MATERIAL DESCARTABLE",
-        "INTERNACION GENERAL",
-        "INTERNACION SIN AISLAMIENTO",
-        "INTERNACION UCI", "INTERNACION UTI",
-        "INGRESO",
-        
-        # Cuidados post-mortem
-        "CUIDADOS POSTMORTEN", "CUIDADOS POST MORTEM", "CUIDADOS POSTMORTEM",
-        
-        # Alimentación (rutinario)
-        "ALIMENTACION ENTERAL",
-        
-        # Rutinas de enfermería - NO SON PROCEDIMIENTOS
-        "SONDA NASOGASTRICA",
-        "ASPIRACION SECRECIONES", "ASPIRACION DE SECRECIONES",
-        "DRENAJE - CONTROL", "DRENAJE CONTROL", "CONTROL Y MEDICION",
-        "SUJECION DEL TUBO", "SUJECION DE TUBO", "FIJACION DEL TUBO",
-        "HIGIENE", "HIGIENE CONFORT", "BAÑO EN CAMA",
-        "CAMBIO DE POSICION", "MOVILIZACION PASIVA",
-        "CURACION PLANA", "CURACION SIMPLE",
-        "CAMBIO DE PAÑAL", "CONTROL DE DEPOSICIONES",
-        "CONTROL DEL DOLOR", "ESCALA DE DOLOR",
-        "MEDICION DE DIURESIS", "BALANCE HIDRICO",
-        
-        # Controles genéricos - NO SON PROCEDIMIENTOS
-        "CONTROL DE", "SIGNOS VITALES", "SATURACION", "TEMPERATURA",
-        "FRECUENCIA CARDIACA", "FRECUENCIA RESPIRATORIA",
-        "TENSION ARTERIAL", "PRESION ARTERIAL",
-        "VALORACION INICIAL", "VALORACION DE ENFERMERIA",
-        "MONITOREO CONTINUO", "MONITOREO CARDIACO",
-        
-        # Observación/Conductas - van en Evolución, no en Procedimientos
-        "OBSERVACION", "CONTROL EVOLUTIVO", "SEGUIMIENTO",
-        "EVALUACION CLINICA", "VALORACION CLINICA",
-    ]
-    
-    # Keywords para identificar laboratorios (se agrupan)
-    LAB_KEYWORDS = [
-        "LABORATORIO", "HEMOGRAMA", "PLAQUETAS", "COAGULACION",
-        "TROMBOPLASTINA", "PROTROMBINA", "ORINA COMPLETA",
-        "ERITROSEDIMENTACION", "HEMOGLOBINA GLICOSILADA", "HB A1C",
-        "PROTEINOGRAMA", "ACIDO FOLICO", "FERREMIA", "RETICULOCITOS",
-        "CEA", "CA 19-9", "CAPACIDAD TOTAL DE FIJACION", "ANTICUERPO",
-        "ANTITIROGLOBULINA", "ATPO-ANTIPEROXIDASA", "PRO BNP",
-        "PARATHORMONA", "VIT D", "25-OH-VIT", "IONOGRAMA", "GASOMETRIA",
-        "GLUCEMIA", "UREMIA", "CREATININA", "HEPATOGRAMA", "GOT", "GPT",
-        "BILIRRUBINA", "ALBUMINA", "PROTEINAS TOTALES", "CULTIVO",
-        "HEMOCULTIVO", "UROCULTIVO", "COPROCULTIVO",
-    ]
-    
     # Categorías que se OCULTAN completamente (no mostrar ni agrupar)
     # Si se pasan excluded_sections, usar esas; sino usar defaults
     default_hidden = {
@@ -941,16 +997,6 @@ def sort_and_group_procedures(
         except:
             return datetime.max
     
-    def is_lab_procedure(descripcion: str) -> bool:
-        """Determina si es un procedimiento de laboratorio."""
-        desc_upper = descripcion.upper()
-        return any(kw in desc_upper for kw in LAB_KEYWORDS)
-    
-    def is_blacklisted(descripcion: str) -> bool:
-        """Verifica si está en lista negra de genéricos."""
-        desc_upper = descripcion.upper()
-        return any(bl in desc_upper for bl in GENERIC_PROCEDURES_BLACKLIST)
-    
     # Contadores para agrupación
     lab_count = 0
     lab_items = []  # Guardar laboratorios individuales para enviar al frontend
@@ -966,7 +1012,7 @@ def sort_and_group_procedures(
         desc_upper = descripcion.upper()
         
         # 1. Verificar si es laboratorio - AGRUPAR, no mostrar individualmente
-        if categoria == "laboratorio" or is_lab_procedure(descripcion):
+        if categoria == "laboratorio" or _PROC_LAB_RE.search(desc_upper):
             lab_count += 1
             if fecha and descripcion:
                 lab_items.append(f"{fecha} - {descripcion}")
@@ -975,7 +1021,7 @@ def sort_and_group_procedures(
             continue  # No agregar individualmente en procedimientos, se agrupa al final
         
         # 2. Verificar si está en lista negra de genéricos
-        if is_blacklisted(descripcion):
+        if _PROC_BLACKLIST_RE.search(desc_upper):
             continue
         
         # 3. Ocultar categorías rutinarias de enfermería
@@ -988,33 +1034,12 @@ def sort_and_group_procedures(
             continue
         
         # 4b. EXCLUIR estudios de imagen (van en sección "Estudios" separada)
-        STUDY_KEYWORDS = [
-            "RX ", "RADIOGRAFIA", "TAC ", "TOMOGRAFIA", "RMN ", "RESONANCIA",
-            "ECOGRAFIA", "ECOCARDIOGRAMA", "CENTELLOGRAMA", "SPECT",
-            "MAMOGRAFIA", "DENSITOMETRIA", "DOPPLER", "ECODOPLER", "ECODOPPLER",
-            "VEDA ", "VCC", "ENDOSCOPIA DIGESTIVA", "COLONOSCOPIA", "BRONCOSCOPIA",
-            "ELECTROCARDIOGRAMA", "ECG", "HOLTER", "ERGOMETRIA",
-        ]
-        is_study = any(kw in desc_upper for kw in STUDY_KEYWORDS)
         # Solo excluir si NO es biopsia/punción (esos son procedimientos)
-        is_invasive = any(kw in desc_upper for kw in ["BIOPSIA", "PUNCION", "COLOCACION", "CATETERISMO"])
-        if is_study and not is_invasive:
+        if _STUDY_RE.search(desc_upper) and not _INVASIVE_RE.search(desc_upper):
             continue  # Este estudio va en la sección "Estudios"
         
         # 5. Más keywords a ocultar (rutina que no entra en categorías)
-        skip_keywords = [
-            "OBSERVACION", "SUEÑO", "REPOSO", "PASE DE", 
-            "REGISTROS", "CONFECCION", "ARREGLO", "ORDEN DE",
-            "INFORMACION AL", "ENTREVISTA", "AVISO",
-            "RETIRAR VIA", "PERMEABILIDAD", "ACCESO VENOSO",
-            "VALORACION DLEE", "VALORACION DE", "VALORACION DEL",
-            "PULSERA", "TRASLADO", "CABECERA", "BARANDAS",
-            "DECUBITO", "ALMOHADA", "CHATA", "ORINAL",
-            "INTERCONSULTA",  # Las interconsultas van en su sección propia
-        ]
-        
-        should_skip = any(kw in desc_upper for kw in skip_keywords)
-        if should_skip:
+        if _PROC_SKIP_RE.search(desc_upper):
             continue
         
         # 6. Filtrar nombres incompletos ("CIRUGIA POR", "TRATAMIENTO DE")
@@ -1094,24 +1119,9 @@ def extract_lab_procedures(
     Returns:
         Lista de strings en formato "DD/MM/YYYY HH:MM - DESCRIPCION"
     """
-    LAB_KEYWORDS = [
-        "LABORATORIO", "HEMOGRAMA", "GLUCEMIA", "CREATININA", "UREMIA", 
-        "IONOGRAMA", "HEPATOGRAMA", "COAGULOGRAMA", "CALCEMIA", "MAGNESIO",
-        "LACTICO", "LÁCTICO", "LDH", "FOSFATEMIA", "ACIDO BASE", "ÁCIDO BASE",
-        "GASOMETRIA", "GASOMETRÍA", "COLESTEROL", "TRIGLICERIDOS", "TRIGLICÉRIDOS",
-        "URICEMIA", "BILIRRUBINA", "PROTEINAS", "PROTEÍNAS", "ALBUMINA", "ALBÚMINA",
-        "AMILASA", "LIPASA", "PCR", "VSG", "ERITROSEDIMENTACION", "ERITROSEDIMENTACIÓN",
-        "FERRITINA", "TRANSFERRINA", "VITAMINA", "HORMONAS", "TSH", "T3", "T4",
-        "HISOPADO", "HEMOCULTIVO", "UROCULTIVO", "COPROCULTIVO", "CULTIVO",
-        "CALCIO IONICO", "CALCIO IÓNICO", "FOSFORO", "FÓSFORO",
-        "POTASIO", "SODIO", "CLORO", "BICARBONATO", "UREA",
-        "TRANSAMINASAS", "GOT", "GPT", "FOSFATASA", "GGT", "GAMMA GT",
-        "TIEMPO DE PROTROMBINA", "TPPA", "DIMERO D", "FIBRINOGENO", "FIBRINÓGENO",
-    ]
-    
     def is_lab(descripcion: str) -> bool:
         desc_upper = descripcion.upper()
-        return any(kw in desc_upper for kw in LAB_KEYWORDS)
+        return _PROC_LAB_RE.search(desc_upper) is not None
     
     def parse_date(p):
         fecha = p.get("fecha", "")
@@ -1395,7 +1405,7 @@ async def generate_epc_from_json(
         todos_diagnosticos = ', '.join(parsed['diagnosticos']) if parsed['diagnosticos'] else 'No especificados'
         
         # TODOS los procedimientos (sin límite)
-        todos_procedimientos = ', '.join([p.get('descripcion', '') for p in parsed['procedimientos']]) if parsed['procedimientos'] else 'No registrados'
+        todos_procedimientos = ', '.join(p.get('descripcion', '') for p in parsed['procedimientos']) or 'No registrados'
         
         # Generar evolución con IA
         ai = GeminiAIService()
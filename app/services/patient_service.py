@@ -16,6 +16,7 @@ from app.domain.models import Admission
 from app.services.hce_parser import extract_text_from_hce, save_upload
 from app.services.ai_gemini_service import GeminiAIService
 from app.adapters.mongo_client import db as mongo
+from app.services.hce_identity import normalize_hce_identity
 from fastapi import HTTPException
 
 
@@ -204,7 +205,7 @@ class PatientService:
         }
         log.debug("Attempting to insert HCE document into MongoDB: %s", doc)
         try:
-            await mongo.hce_docs.insert_one(doc)
+            await mongo.hce_docs.insert_one(normalize_hce_identity(doc))
             log.debug("HCE document inserted successfully.")
         except Exception as e:
             log.error("Error inserting HCE document into MongoDB: %s", e, exc_info=True)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Backfill: normaliza la identidad de paciente en los HCE existentes.
+
+Escribe `patient_id` (string canónico) y `patient_uuid` (Binary subtype 4)
+a partir de los campos alternativos (patientId, paciente.id, ...). Es
+idempotente; al terminar se puede activar EPC_HCE_CANONICAL_IDS=true.
+"""
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+
+from app.adapters.mongo_client import pick_hce_collections
+from app.services.hce_identity import PATIENT_ID_FIELDS, canonical_patient_id, hce_identity_fields
+
+BATCH = 500
+
+
+async def backfill():
+    projection = {f: 1 for f in PATIENT_ID_FIELDS}
+    projection["patient_uuid"] = 1
+    for coll in await pick_hce_collections():
+        print(f"Normalizando {coll.name}...")
+        scanned = updated = 0
+        ops = []
+        async for doc in coll.find({}, projection).batch_size(BATCH):
+            scanned += 1
+            fields = hce_identity_fields(doc)
+            if not fields:
+                continue
+            pid = fields["patient_id"]
+            if doc.get("patient_id") == pid and (
+                "patient_uuid" not in fields or canonical_patient_id(doc.get("patient_uuid")) == pid
+            ):
+                continue
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            if len(ops) >= BATCH:
+                res = await coll.bulk_write(ops, ordered=False)
+                updated += res.modified_count
+                ops = []
+        if ops:
+            res = await coll.bulk_write(ops, ordered=False)
+            updated += res.modified_count
+        print(f"  {scanned} HCE revisados, {updated} actualizados")
+
+    print("Backfill finished!")
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
@@ -0,0 +1,61 @@
+"""Fechas del generador por secciones con separadores no canónicos (varios espacios, tab)."""
+import pytest
+
+pytest.importorskip("httpx")
+
+from datetime import datetime
+
+from app.services.epc_section_generator import (
+    _format_fecha_hora,
+    _parse_fecha_sort_key,
+    extract_interconsultas_from_hce,
+    extract_procedures_from_hce,
+    sort_procedures_chronologically,
+)
+
+
+@pytest.mark.parametrize("fecha_hora", [
+    "2024-03-05 14:30:00",
+    "2024-03-05  14:30:00",
+    "2024-03-05\t14:30:00",
+    "2024-03-05 \t 14:30:00",
+])
+def test_format_fecha_hora_separadores(fecha_hora):
+    assert _format_fecha_hora(fecha_hora) == "05/03/2024 14:30"
+
+
+def test_format_fecha_hora_invalida_se_devuelve_tal_cual():
+    assert _format_fecha_hora("2024-13-05 14:30:00") == "2024-13-05 14:30:00"
+    assert _format_fecha_hora("2024-02-30\t14:30:00") == "2024-02-30\t14:30:00"
+
+
+@pytest.mark.parametrize("fecha, esperado", [
+    ("05/03/2024 14:30", datetime(2024, 3, 5, 14, 30)),
+    ("05/03/2024  14:30", datetime(2024, 3, 5, 14, 30)),
+    ("05/03/2024\t14:30", datetime(2024, 3, 5, 14, 30)),
+    ("05/03/2024", datetime(2024, 3, 5)),
+    ("", datetime.max),
+    ("31/02/2024 10:00", datetime.max),
+])
+def test_parse_fecha_sort_key(fecha, esperado):
+    assert _parse_fecha_sort_key(fecha) == esperado
+
+
+def test_extractores_con_tab_y_varios_espacios():
+    hce = (
+        "- [2024-03-05\t14:30:00] PROCEDIMIENTO\n  Colocación de vía central\n"
+        "- [2024-03-06   09:15:00] EVOLUCION DE INTERCONSULTA\nINTERCONSULTA CARDIOLOGIA\n"
+    )
+    procs = extract_procedures_from_hce(hce)
+    assert any(p["fecha"] == "05/03/2024 14:30" for p in procs)
+    ics = extract_interconsultas_from_hce(hce)
+    assert any(ic["fecha"] == "06/03/2024 09:15" for ic in ics)
+
+
+def test_sort_procedures_con_tab():
+    procs = [
+        {"fecha": "06/03/2024\t09:15", "descripcion": "B"},
+        {"fecha": "05/03/2024  14:30", "descripcion": "A"},
+    ]
+    out = sort_procedures_chronologically(procs)
+    assert [o.split(" - ")[0] for o in out] == ["05/03/2024  14:30", "06/03/2024\t09:15"]